@@ -0,0 +1,217 @@
+import os
+import re
+import sqlite3
+import contextlib
+import threading
+import numpy as np
+import pandas as pd
+import Datos
+import ETL
+import Historico
+
+# Almacén embebido opcional (SQLite) para el histórico: las tablas original y limpia viven en disco con índices
+# por estación, hora, feriado y fecha, y las consultas del tablero son agregados indexados. Ningún proceso
+# necesita cargar el histórico completo en memoria. Se activa con HISTORICO_BACKEND=sqlite (ver Registro.py).
+TAMANO_BLOQUE = 100_000
+# Consultas distintas (estación y filtros) cuya distribución se conserva en memoria
+CONSULTAS_EN_MEMORIA = 64
+
+INDICES = {
+    'originales': [
+        # Cubre la consulta del histórico por estación: agrupa por hora y demanda sin tocar la tabla
+        ('originales_estacion_hora', ['seasons', 'hour', 'rented_bike_count']),
+        ('originales_feriado', ['holiday', 'seasons', 'hour']),
+        ('originales_fecha', ['date']),
+    ],
+    'limpios': [
+        ('limpios_hora', ['hour']),
+        ('limpios_feriado', ['holiday']),
+    ],
+}
+
+def nombre_sql(columna):
+    # 'Temperature(C)' -> 'temperature_c'
+    return re.sub(r'[^0-9a-z]+', '_', columna.lower()).strip('_')
+
+def _originales(bloque):
+    # Fecha ISO para poder filtrar por rango con el índice; feriado y servicio como 0/1
+    bloque = bloque.copy()
+    bloque['Date'] = pd.to_datetime(bloque['Date'], dayfirst=True).dt.strftime('%Y-%m-%d')
+    bloque['Holiday'] = (bloque['Holiday'] == 'Holiday').astype(np.int64)
+    bloque['Functioning Day'] = (bloque['Functioning Day'] == 'Yes').astype(np.int64)
+    return bloque
+
+def importar(ruta_base, ruta_originales, ruta_limpios, tamano_bloque=TAMANO_BLOQUE):
+    # Se construye en un archivo temporal y se reemplaza: los lectores ven la base anterior o la nueva completa
+    with Datos.escritura_atomica(ruta_base, None) as temporal:
+        with contextlib.closing(sqlite3.connect(temporal)) as conexion, conexion:
+            conexion.execute('CREATE TABLE fuentes (tabla TEXT PRIMARY KEY, ruta TEXT, hash TEXT, mtime_ns INTEGER, '
+                             'tamano INTEGER)')
+            for tabla, ruta in [('originales', ruta_originales), ('limpios', ruta_limpios)]:
+                tipos = ETL.TIPOS_ORIGINALES if tabla == 'originales' else None
+                for bloque in Datos.leer_csv(ruta, chunksize=tamano_bloque, dtype=tipos):
+                    if tabla == 'originales':
+                        bloque = _originales(bloque)
+                    bloque.rename(columns=nombre_sql).to_sql(tabla, conexion, if_exists='append', index=False)
+                for nombre, columnas in INDICES[tabla]:
+                    conexion.execute(f'CREATE INDEX {nombre} ON {tabla} ({", ".join(columnas)})')
+                conexion.execute('INSERT INTO fuentes VALUES (?, ?, ?, ?, ?)',
+                                 (tabla, ruta, Datos.hash_archivo(ruta), *Datos.firma_archivo(ruta)))
+            conexion.execute('ANALYZE')
+
+def fuentes_vigentes(ruta_base, ruta_originales, ruta_limpios):
+    if not os.path.exists(ruta_base):
+        return False
+    with sqlite3.connect(f'file:{ruta_base}?mode=ro', uri=True) as conexion:
+        try:
+            registradas = {t: (r, h, (m, s)) for t, r, h, m, s in conexion.execute('SELECT * FROM fuentes')}
+        except sqlite3.DatabaseError:
+            return False
+    for tabla, ruta in [('originales', ruta_originales), ('limpios', ruta_limpios)]:
+        if tabla not in registradas:
+            return False
+        _, hash_registrado, firma = registradas[tabla]
+        # Igual que la caché columnar: si solo se tocó el archivo, el hash decide
+        if firma != Datos.firma_archivo(ruta) and hash_registrado != Datos.hash_archivo(ruta):
+            return False
+    return True
+
+def contenido_base(ruta_base):
+    # Hash de las fuentes importadas en la base: identifica su contenido en cualquier proceso
+    with contextlib.closing(sqlite3.connect(f'file:{ruta_base}?mode=ro', uri=True)) as conexion:
+        return ':'.join(h for h, in conexion.execute('SELECT hash FROM fuentes ORDER BY tabla'))
+
+# Misma interfaz que Historico.CuboDemanda (consultar, filas, puntos, estaciones, version, contenido), más filtros
+# por rango de fechas y por feriado. Cada consulta trae la distribución (hora, demanda, frecuencia) agrupada en
+# SQLite, que está acotada por el rango de la demanda y no por el número de filas; los cuantiles salen de ella en numpy.
+class AlmacenHistorico:
+    filtrable = True
+
+    def __init__(self, ruta_base, ruta_originales, ruta_limpios):
+        self.ruta_base = ruta_base
+        self.ruta_originales = ruta_originales
+        self.ruta_limpios = ruta_limpios
+        self.version = 0
+        self.contenido = None
+        self._firmas = None
+        self._hilo = None
+        self._locales = threading.local()
+        self._candado = threading.Lock()
+        self._distribuciones = {}
+        # En el arranque no hay base anterior que servir: la primera importación se espera
+        self._reimportar()
+
+    def _firmas_fuentes(self):
+        return Datos.firma_archivo(self.ruta_originales), Datos.firma_archivo(self.ruta_limpios)
+
+    def vigilar(self):
+        # Cuando cambian los CSV fuente se reimporta en un hilo aparte y, mientras tanto, las consultas siguen
+        # respondiendo con la base anterior; la comprobación normal es solo un stat por archivo
+        if self._firmas_fuentes() == self._firmas:
+            return
+        with self._candado:
+            if self._firmas_fuentes() == self._firmas or (self._hilo is not None and self._hilo.is_alive()):
+                return
+            self._hilo = threading.Thread(target=self._reimportar, name='importacion-historico', daemon=True)
+            self._hilo.start()
+
+    def _reimportar(self):
+        firmas = self._firmas_fuentes()
+        try:
+            # Entre workers de gunicorn solo uno importa; los demás esperan y usan la base que dejó en disco
+            with Datos.bloqueo_archivo(self.ruta_base):
+                if not fuentes_vigentes(self.ruta_base, self.ruta_originales, self.ruta_limpios):
+                    importar(self.ruta_base, self.ruta_originales, self.ruta_limpios)
+                contenido = contenido_base(self.ruta_base)
+        except Exception as e:
+            # Una fuente a medio escribir no tumba el tablero: se sigue con la base anterior y se reintenta
+            if self._firmas is None:
+                raise
+            print(f'Error al importar el histórico en {self.ruta_base}: {e}')
+            return
+        with self._candado:
+            self._distribuciones = {}
+            self._firmas = firmas
+            self.contenido = contenido
+            self.version += 1
+
+    def _conexion(self):
+        # Una conexión de solo lectura por hilo; se reabre si la base se reemplazó
+        self.vigilar()
+        conexion, version = getattr(self._locales, 'conexion', (None, None))
+        if conexion is None or version != self.version:
+            if conexion is not None:
+                conexion.close()
+            conexion = sqlite3.connect(f'file:{self.ruta_base}?mode=ro', uri=True, check_same_thread=False)
+            self._locales.conexion = (conexion, self.version)
+        return conexion
+
+    def consulta(self, sql, parametros=()):
+        return pd.read_sql_query(sql, self._conexion(), params=parametros)
+
+    def estaciones(self):
+        return [e for (e,) in self._conexion().execute('SELECT DISTINCT seasons FROM originales ORDER BY rowid')]
+
+    def rango_fechas(self):
+        return self._conexion().execute('SELECT MIN(date), MAX(date) FROM originales').fetchone()
+
+    def distribucion(self, season, desde=None, hasta=None, feriado=None):
+        conexion = self._conexion()
+        clave = (self.version, season, desde, hasta, feriado)
+        distribucion = self._distribuciones.get(clave)
+        if distribucion is not None:
+            return distribucion
+
+        condiciones, parametros = ['seasons = ?'], [season]
+        if desde is not None:
+            condiciones.append('date >= ?')
+            parametros.append(str(desde)[:10])
+        if hasta is not None:
+            condiciones.append('date <= ?')
+            parametros.append(str(hasta)[:10])
+        if feriado is not None:
+            condiciones.append('holiday = ?')
+            parametros.append(int(bool(feriado)))
+        filas = conexion.execute(
+            'SELECT hour, rented_bike_count, COUNT(*) FROM originales '
+            f'WHERE {" AND ".join(condiciones)} GROUP BY hour, rented_bike_count ORDER BY hour, rented_bike_count',
+            parametros).fetchall()
+        distribucion = np.array(filas, dtype=np.float64).reshape(-1, 3)
+
+        with self._candado:
+            if len(self._distribuciones) >= CONSULTAS_EN_MEMORIA:
+                self._distribuciones.pop(next(iter(self._distribuciones)))
+            self._distribuciones[clave] = distribucion
+        return distribucion
+
+    def _por_hora(self, season, **filtros):
+        distribucion = self.distribucion(season, **filtros)
+        horas, inicios = np.unique(distribucion[:, 0], return_index=True)
+        for hora, valores, frecuencias in zip(horas.astype(int), np.split(distribucion[:, 1], inicios[1:]),
+                                              np.split(distribucion[:, 2], inicios[1:])):
+            yield hora, valores, np.cumsum(frecuencias)
+
+    def consultar(self, season, **filtros):
+        celdas = {}
+        for hora, valores, acumulado in self._por_hora(season, **filtros):
+            celdas[hora] = Historico.estadisticos(valores, acumulado)
+        tabla = pd.DataFrame.from_dict(celdas, orient='index', columns=Historico.ESTADISTICOS)
+        tabla.index.name = 'Hour'
+        return tabla
+
+    def filas(self, season, **filtros):
+        return int(self.distribucion(season, **filtros)[:, 2].sum())
+
+    def puntos(self, season, presupuesto=None, **filtros):
+        # Mismo muestreo por rangos que CuboDemanda.puntos, sin expandir las frecuencias a filas
+        total = self.filas(season, **filtros)
+        horas, demandas = [], []
+        for hora, valores, acumulado in self._por_hora(season, **filtros):
+            n = k = int(acumulado[-1])
+            if presupuesto is not None and total > presupuesto:
+                k = max(1, int(round(presupuesto * n / total)))
+            horas.append(np.full(k, hora))
+            demandas.append(Historico.muestra(valores, acumulado, k))
+        if not horas:
+            return np.empty(0), np.empty(0)
+        return np.concatenate(horas), np.concatenate(demandas)
@@ -0,0 +1,136 @@
+import io
+import json
+import numpy as np
+import pandas as pd
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+import Modelo
+import Registro
+import Estimadores
+import Reentrenamiento
+import Variables
+
+# Mismos campos que los controles del tablero (ver Variables.py); holiday, functioningDay y season son opcionales.
+# Con las columnas city y/o segment cada escenario se puntúa con el modelo correspondiente del registro.
+# Con ?backend=<nombre> se puntúa con un estimador ya ajustado (ver Estimadores.SERVIDOS) en lugar del OLS
+CAMPOS_COSTOS = ['fixedCost', 'variableCost', 'profitability']
+TAMANO_BLOQUE = 5000
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+def codificar(escenarios, artefacto):
+    # El esquema se valida contra el mismo artefacto que luego puntúa la matriz, así un intercambio del modelo
+    # entre la codificación y la predicción no puede desalinear las columnas
+    return Variables.obtener_esquema(artefacto).validar(artefacto).matriz(escenarios)
+
+def por_modelo(escenarios):
+    return 'city' in escenarios or 'segment' in escenarios
+
+def puntuar(escenarios, costos=None, X=None, prediccion=None, artefacto=None):
+    # Con X, artefacto debe ser el artefacto con el que se codificó
+    if prediccion is not None:
+        media, inf, sup = prediccion
+    elif por_modelo(escenarios):
+        media, inf, sup = Registro.obtener_registro().predecir(escenarios)
+    else:
+        artefacto = artefacto or Modelo.obtener_modelo()
+        if X is None:
+            X = codificar(escenarios, artefacto)
+        media, inf, sup = Modelo.predict_batch(X, artefacto=artefacto)
+
+    # Igual que en el tablero: sin servicio no hay demanda y una demanda negativa se reporta como 0
+    if 'functioningDay' in escenarios:
+        funcionando = Variables.si_no(escenarios['functioningDay'])
+        media, inf, sup = media * funcionando, inf * funcionando, sup * funcionando
+    resultado = pd.DataFrame({'mean': np.maximum(media, 0), 'lower': np.maximum(inf, 0),
+                              'upper': np.maximum(sup, 0)})
+
+    if costos is not None:
+        fijo, variable, rentabilidad = (np.asarray(costos[c], dtype=np.float64) for c in CAMPOS_COSTOS)
+        demanda = resultado['mean'].to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precio = (fijo + variable * demanda) / demanda + rentabilidad
+        resultado['price'] = np.where(demanda > 0, precio, np.nan)
+    return resultado
+
+def _leer_peticion():
+    if request.mimetype == 'text/csv':
+        escenarios = pd.read_csv(io.BytesIO(request.get_data()))
+    else:
+        cuerpo = request.get_json(silent=True)
+        if isinstance(cuerpo, dict):
+            cuerpo = cuerpo.get('scenarios')
+        if not isinstance(cuerpo, list):
+            raise ValueError('Se esperaba un arreglo JSON de escenarios o un cuerpo text/csv')
+        escenarios = pd.DataFrame.from_records(cuerpo)
+
+    # Los costos pueden venir por escenario (columnas) o para todo el lote (parámetros de la URL)
+    costos = None
+    if all(c in escenarios for c in CAMPOS_COSTOS):
+        costos = {c: escenarios[c].to_numpy(dtype=np.float64) for c in CAMPOS_COSTOS}
+    elif all(c in request.args for c in CAMPOS_COSTOS):
+        costos = {c: float(request.args[c]) for c in CAMPOS_COSTOS}
+    return escenarios, costos
+
+def _ndjson(bloque):
+    return ''.join(json.dumps({k: (None if pd.isna(v) else v) for k, v in fila.items()}) + '\n'
+                   for fila in bloque.to_dict('records'))
+
+@api.route('/predict', methods=['POST'])
+def predecir():
+    try:
+        escenarios, costos = _leer_peticion()
+        tamano = int(request.args.get('chunk', TAMANO_BLOQUE))
+        if tamano <= 0:
+            raise ValueError('chunk debe ser positivo')
+        # Se codifica (y valida) todo el lote antes de empezar a transmitir la respuesta; con varios modelos
+        # se puntúa completo de una vez, agrupado por modelo, y luego se transmite por bloques
+        X, prediccion, artefacto = None, None, None
+        backend = request.args.get('backend')
+        if backend is not None:
+            if por_modelo(escenarios):
+                raise ValueError('backend no se puede combinar con city o segment')
+            # El estimador ya está ajustado (Estimadores.preparar); se codifica con sus propias columnas
+            estimador = Estimadores.obtener(backend)
+            prediccion = estimador.predecir(Variables.EsquemaVariables(estimador.columnas).matriz(escenarios))
+        elif por_modelo(escenarios):
+            prediccion = Registro.obtener_registro().predecir(escenarios)
+        else:
+            # Un solo artefacto para todo el lote, aunque el modelo se intercambie mientras se transmite
+            artefacto = Modelo.obtener_modelo()
+            X = codificar(escenarios, artefacto)
+    except (ValueError, KeyError, pd.errors.ParserError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    formato_csv = request.mimetype == 'text/csv' or 'text/csv' in request.headers.get('Accept', '')
+
+    def generar():
+        for inicio in range(0, len(escenarios), tamano):
+            bloque = escenarios.iloc[inicio:inicio + tamano]
+            costos_bloque = costos
+            if costos is not None and not np.isscalar(costos['fixedCost']):
+                costos_bloque = {c: v[inicio:inicio + tamano] for c, v in costos.items()}
+            if prediccion is not None:
+                resultado = puntuar(bloque, costos_bloque, prediccion=[v[inicio:inicio + tamano] for v in prediccion])
+            else:
+                resultado = puntuar(bloque, costos_bloque, X[inicio:inicio + tamano], artefacto=artefacto)
+            if formato_csv:
+                yield resultado.to_csv(index=False, header=inicio == 0)
+            else:
+                yield _ndjson(resultado)
+
+    return Response(stream_with_context(generar()),
+                    mimetype='text/csv' if formato_csv else 'application/x-ndjson')
+
+@api.route('/model', methods=['GET'])
+def modelo():
+    return jsonify(Reentrenamiento.obtener_servicio().estado())
+
+@api.route('/retrain', methods=['POST'])
+def reentrenar():
+    # Disparo explícito: responde de inmediato y el ajuste ocurre en el hilo de reentrenamiento
+    servicio = Reentrenamiento.obtener_servicio()
+    servicio.disparar(forzar=request.args.get('force', '').lower() in Variables.VERDADEROS)
+    return jsonify(servicio.estado()), 202
+
+def registrar(server):
+    server.register_blueprint(api)
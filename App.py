@@ -1,43 +1,61 @@
 import dash
 from dash import dcc
 from dash import html
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction
 import plotly.express as px
 import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
 import Modelo
+import Historico
+import Cache
+import Datos
+import Api
+import Rejilla
+import Simulacion
+import Metricas
+import Registro
+import Pronostico
+import Reentrenamiento
+import Estimadores
+import base64
 import os
 import pandas as pd
-import glob
 
 app = dash.Dash(__name__)
 server = app.server
 
-# Definir los nombres de los archivos que estás buscando
-file_name_clean = 'SeoulBikeDataClean.csv'
-file_name_utf8 = 'SeoulBikeData_utf8.csv'
+# Endpoint de puntuación por lotes (POST /api/predict) sobre el mismo servidor Flask
+Api.registrar(server)
 
-# Buscar el archivo 'SeoulBikeDataClean.csv'
-files_found_clean = glob.glob(f'**/{file_name_clean}', recursive=True)
+# Los datos no se cargan aquí: el registro (ver Registro.py) lee de cada archivo solo lo que necesitan
+# el modelo y el cubo histórico de cada ciudad
 
-# Buscar el archivo 'SeoulBikeData_utf8.csv'
-files_found_utf8 = glob.glob(f'**/{file_name_utf8}', recursive=True)
+# Caché LRU de figuras ya serializadas, indexada por las entradas normalizadas de cada callback
+figureCache = Cache.crear_cache()
 
-# Cargar el archivo 'SeoulBikeDataClean.csv' si se encuentra
-if files_found_clean:
-    file_path_clean = files_found_clean[0]  # Usar el primer archivo encontrado
-    data = pd.read_csv(file_path_clean)
-    print(f'Archivo {file_name_clean} cargado desde: {file_path_clean}')
-else:
-    print(f'No se encontró el archivo {file_name_clean}. Verifica su ubicación.')
+# Tiempos, conteos y perfiles de los callbacks y del modelo, expuestos en /metrics
+Metricas.registrar_fuente('cache_figuras', figureCache.estadisticas)
+Metricas.instalar(server, os.path.join(Datos.DIRECTORIO_CACHE, 'perfiles'))
 
-# Cargar el archivo 'SeoulBikeData_utf8.csv' si se encuentra
-if files_found_utf8:
-    file_path_utf8 = files_found_utf8[0]  # Usar el primer archivo encontrado
-    originalData = pd.read_csv(file_path_utf8)
-    print(f'Archivo {file_name_utf8} cargado desde: {file_path_utf8}')
-else:
-    print(f'No se encontró el archivo {file_name_utf8}. Verifica su ubicación.')
+# Cargar (o entrenar una única vez) el artefacto del modelo antes de atender peticiones
+Modelo.obtener_modelo()
+
+# Los estimadores alternativos de /api/predict?backend= también se ajustan (o cargan) aquí y no en una petición
+Estimadores.preparar()
+
+# Modelos por ciudad, cargados en el primer uso; la ciudad por defecto comparte el artefacto anterior
+modelRegistry = Registro.obtener_registro()
+
+# Cubo de demanda por estación y hora para la gráfica histórica de la ciudad por defecto
+demandCube = modelRegistry.cubo(Registro.CIUDAD_POR_DEFECTO)
+seasonOptions = [{'label': i, 'value': i} for i in demandCube.estaciones()]
+
+# Rango de fechas y feriados solo se pueden filtrar con el histórico en SQLite
+historicDates = demandCube.rango_fechas() if demandCube.filtrable else (None, None)
+
+# Cada cuánto el navegador pregunta si cambió la versión del modelo que usa en el modo en vivo
+modelCheckInterval = 60 * 1000
 
 base_style = {
     'font-family': 'Arial, sans-serif',
@@ -63,15 +81,34 @@ section_style = {
 app.layout = html.Div([
     html.H1("Seoul Bike Sharing Demand", style=title_style),
 
+    html.Div([
+        html.Label(['Select the city:'], style={'font-weight': 'bold'}),
+        dcc.Dropdown(id='dropdownCity', options=[{'label': i, 'value': i} for i in modelRegistry.ciudades],
+                     value=Registro.CIUDAD_POR_DEFECTO, clearable=False)
+    ], style={'width': '50%', 'margin': '0 auto'}),
+
     html.Div(style=section_style, children=[
         html.H2("Historic Demand", style={'text-align': 'center'}),
         html.Label(['Select the season:'], style={'font-weight': 'bold', 'margin': '0 auto'}),
         dcc.Dropdown(
             id='dropdownSeason',
-            options=[{'label': i, 'value': i} for i in originalData['Seasons'].unique()],
+            options=seasonOptions,
             value='Winter',
             style={'width': '50%', 'margin': '0 auto'}
         ),
+        html.Div([
+            dcc.DatePickerRange(id='historicDates', min_date_allowed=historicDates[0],
+                                max_date_allowed=historicDates[1], disabled=not demandCube.filtrable,
+                                clearable=True),
+            dcc.RadioItems(
+                id='historicHoliday',
+                options=[{'label': label, 'value': value, 'disabled': not demandCube.filtrable}
+                         for label, value in [('All days', 'all'), ('Holidays only', 'yes'), ('Non-holidays', 'no')]],
+                value='all',
+                inline=True,
+                style={'padding': '10px'}
+            ),
+        ], style={'text-align': 'center', 'padding-top': '10px'}),
         dcc.Graph(id='historicDemand')
     ]),
 
@@ -84,11 +121,18 @@ app.layout = html.Div([
             value=['Functioning Day'],
             style={'padding': '10px'}
         ),
+        dcc.RadioItems(
+            id='predictionMode',
+            options=[{'label': 'On Predict click', 'value': 'server'}, {'label': 'Live (in browser)', 'value': 'live'}],
+            value='server',
+            inline=True,
+            style={'padding': '10px'}
+        ),
 
         # Sliders de parámetros
         html.Div([
             html.Label(['Select the season:'], style={'font-weight': 'bold'}),
-            dcc.Dropdown(id='dropdownSeason2', options=[{'label': i, 'value': i} for i in originalData['Seasons'].unique()]),
+            dcc.Dropdown(id='dropdownSeason2', options=seasonOptions),
             html.Br(),
             html.Label(['Temperature:'], style={'font-weight': 'bold'}),
             dcc.Slider(id='temperatureSlider', min=-20, max=50, step=1, value=0, marks={i: f'{i}' for i in range(-20, 51, 5)}),
@@ -125,6 +169,23 @@ app.layout = html.Div([
             html.H2('Demand Predicted:'),
             html.H1(id='outputDemand', style={'fontSize': '40px', 'color': '#28a745'})
         ], style={'text-align': 'center'}),
+
+        # Modo en vivo: demanda, intervalo, precio y costos calculados en el navegador (assets/prediccion.js)
+        # con los parámetros del modelo, que el servidor solo vuelve a enviar cuando cambia su versión
+        html.Div(id='livePanel', children=[
+            html.H2('Live Demand:'),
+            html.H1(id='outputLiveDemand', style={'fontSize': '40px', 'color': '#28a745', 'white-space': 'pre-line'}),
+            html.H2('Live Suggested Price per Bike per hour (costs from Cost Analysis):'),
+            html.H1(id='outputLivePrice', style={'fontSize': '40px', 'color': '#28a745'}),
+            html.Div([dcc.Graph(id='liveCostDistribution')], style={'width': '70%', 'margin': '0 auto'}),
+        ], style={'display': 'none'}),
+        dcc.Store(id='modelParameters'),
+        dcc.Interval(id='modelVersionCheck', interval=modelCheckInterval),
+
+        # Sensibilidad de la demanda por hora y temperatura, con el resto de controles fijos
+        html.Div([
+            dcc.Graph(id='demandHeatmap')
+        ], style={'width': '70%', 'margin': '0 auto'}),
     ]),
 
     html.Div(style=section_style, children=[
@@ -156,6 +217,32 @@ app.layout = html.Div([
         html.Div([
             dcc.Graph(id='costDistribution')
         ], style={'width': '70%', 'margin': '0 auto', 'padding-top': '20px'}),
+
+        # Simulación Monte Carlo del precio a partir de la distribución predictiva de la demanda
+        html.Div([
+            html.Label(['Required probability of covering costs:'], style={'font-weight': 'bold'}),
+            dcc.Slider(id='breakEvenTarget', min=0.5, max=0.99, step=0.01, value=0.9,
+                       marks={v: f'{v:.0%}' for v in [0.5, 0.6, 0.7, 0.8, 0.9, 0.99]}),
+            html.H2('Price covering costs with the required probability:', style={'font-weight': 'bold'}),
+            html.H1(id='outputOptimalPrice', style={'fontSize': '40px', 'color': '#28a745'}),
+            dcc.Graph(id='profitSimulation')
+        ], style={'width': '70%', 'margin': '0 auto', 'padding-top': '20px', 'text-align': 'center'}),
+
+        # Demanda calculada una vez por clic y compartida por el precio y la gráfica de costos
+        dcc.Store(id='pricePrediction'),
+    ]),
+
+    html.Div(style=section_style, children=[
+        html.H2("Week-Ahead Forecast", style={'text-align': 'center'}),
+        html.Label([f'Upload an hourly weather forecast ({Pronostico.HORAS_MINIMAS} to {Pronostico.HORAS_MAXIMAS} rows, '
+                    'CSV with the prediction fields; prices use the costs above):'], style={'font-weight': 'bold'}),
+        dcc.Upload(id='forecastUpload', children=html.Div(['Drag and drop or ', html.A('select a CSV file')]), style={
+            'width': '60%', 'margin': '10px auto', 'padding': '20px', 'border': '1px dashed #0056b3',
+            'border-radius': '5px', 'text-align': 'center'
+        }),
+        html.Div(id='forecastSummary', style={'text-align': 'center', 'font-weight': 'bold'}),
+        dcc.Graph(id='forecastDemand'),
+        dcc.Graph(id='forecastPrice'),
     ])
 ])
 
@@ -171,74 +258,107 @@ app.layout = html.Div([
     State('rainfallSlider', 'value'),
     State('snowfallSlider', 'value'),
     State('checkBoxDummies', 'value'),
-    State('dropdownSeason2', 'value')
+    State('dropdownSeason2', 'value'),
+    State('dropdownCity', 'value')
 )
+@Metricas.instrumentar('app_callback_segundos')
 def updateDemand(n_clicks, hourSlider, temperatureSlider, humiditySlider, windSpeedSlider,
-                 dewPointTemperatureSlider, solarRadiationSlider, rainfallSlider, snowfallSlider, checkBoxDummies, dropdownSeason2):
+                 dewPointTemperatureSlider, solarRadiationSlider, rainfallSlider, snowfallSlider, checkBoxDummies, dropdownSeason2,
+                 dropdownCity=Registro.CIUDAD_POR_DEFECTO):
     demand = 0
     response = ''
     if n_clicks > 0:
         if 'Functioning Day' in checkBoxDummies:
-            x = []
-            model = Modelo.modeloRLS()[0]
-            coef = model.coef_
-            demand = model.intercept_
-
-            x.append(hourSlider)
-            x.append(temperatureSlider)
-            x.append(humiditySlider)
-            x.append(windSpeedSlider)
-            x.append(dewPointTemperatureSlider)
-            x.append(solarRadiationSlider)
-            x.append(rainfallSlider)
-            x.append(snowfallSlider)
-            x.append(1 if 'Holiday' in checkBoxDummies else 0)
-            x.append(1)
-            if dropdownSeason2 == 'Spring':
-                x.append(1)
-                x.append(0)
-                x.append(0)
-            elif dropdownSeason2 == 'Summer':
-                x.append(0)
-                x.append(1)
-                x.append(0)
-            elif dropdownSeason2 == 'Winter':
-                x.append(0)
-                x.append(0)
-                x.append(1)
-            else:
-                x.append(0)
-                x.append(0)
-                x.append(0) 
-
-            for i in range(len(coef)):
-                demand = demand + coef[i] * x[i]
+            entry = modelRegistry.entrada(dropdownCity)
+            x = entry['esquema'].desde_controles(hourSlider, temperatureSlider, humiditySlider,
+                                                 windSpeedSlider, dewPointTemperatureSlider,
+                                                 solarRadiationSlider, rainfallSlider, snowfallSlider,
+                                                 checkBoxDummies, dropdownSeason2)
+            demand, inf, sup = Modelo.predict_one(x, artefacto=entry['artefacto'])
 
             if demand < 0:
                 response = '0'
             else:
-                inf = demand - 1.44 * Modelo.modeloRLS()[1]
-                sup = demand + 1.44 * Modelo.modeloRLS()[1]
                 response = f'CI: ({inf:.2f} , {sup:.2f})\nMedia: {demand:.2f}'
         
     return response
 
+@app.callback(
+    Output('demandHeatmap', 'figure'),
+    Input('buttonPredict', 'n_clicks'),
+    State('humiditySlider', 'value'),
+    State('windSpeedSlider', 'value'),
+    State('dewPointTemperatureSlider', 'value'),
+    State('solarRadiationSlider', 'value'),
+    State('rainfallSlider', 'value'),
+    State('snowfallSlider', 'value'),
+    State('checkBoxDummies', 'value'),
+    State('dropdownSeason2', 'value'),
+    State('dropdownCity', 'value')
+)
+@Metricas.instrumentar('app_callback_segundos')
+def updateDemandHeatmap(n_clicks, humiditySlider, windSpeedSlider, dewPointTemperatureSlider, solarRadiationSlider,
+                        rainfallSlider, snowfallSlider, checkBoxDummies, dropdownSeason2,
+                        dropdownCity=Registro.CIUDAD_POR_DEFECTO):
+    fig = go.Figure()
+    if n_clicks > 0 and 'Functioning Day' in checkBoxDummies:
+        table = modelRegistry.tabla(dropdownCity)
+        grid = table.subrejilla(['hour', 'temperature'], humidity=humiditySlider, windSpeed=windSpeedSlider,
+                                dewPointTemperature=dewPointTemperatureSlider, solarRadiation=solarRadiationSlider,
+                                rainfall=rainfallSlider, snowfall=snowfallSlider,
+                                holiday='Holiday' in checkBoxDummies, season=dropdownSeason2)
+        fig.add_trace(go.Heatmap(x=Rejilla.valores('temperature'), y=Rejilla.valores('hour'),
+                                 z=grid.clip(min=0), colorbar={'title': 'Demand'}))
+        fig.update_layout(title_text=f"Predicted demand by hour and temperature ({dropdownSeason2 or 'Autumn'})",
+                          title_x=0.5, xaxis_title='Temperature', yaxis_title='Hour')
+    return fig
+
 @app.callback(
     Output('historicDemand', 'figure'),
-    Input('dropdownSeason', 'value')
+    Input('dropdownSeason', 'value'),
+    Input('dropdownCity', 'value'),
+    Input('historicDates', 'start_date'),
+    Input('historicDates', 'end_date'),
+    Input('historicHoliday', 'value')
 )
-def updateHistoricDemand(season):
-    filteredData = originalData[originalData['Seasons'] == season]
+@Metricas.instrumentar('app_callback_segundos')
+@Cache.cachear_figura(figureCache, version=lambda season, city=Registro.CIUDAD_POR_DEFECTO, *filters:
+                     modelRegistry.contenido_cubo(city))
+def updateHistoricDemand(season, city=Registro.CIUDAD_POR_DEFECTO, startDate=None, endDate=None, holiday='all'):
+    cube = modelRegistry.cubo(city)
+    filters = {}
+    if cube.filtrable:
+        filters = {'desde': startDate, 'hasta': endDate, 'feriado': {'yes': True, 'no': False}.get(holiday)}
+    filteredData = cube.consultar(season, **filters)
+    rows = cube.filas(season, **filters)
+    mode = Historico.modo_render(rows)
     fig = go.Figure()
 
-    fig.add_trace(go.Bar(x=filteredData['Hour'], y=filteredData['Rented Bike Count'], name='Rented Bike Count'))
+    if mode == 'cuantiles':
+        # Cajas a partir de los cuantiles precalculados del cubo: 24 glifos sin importar cuántos años haya
+        fig.add_trace(go.Box(x=filteredData.index, q1=filteredData['p25'], median=filteredData['median'],
+                             q3=filteredData['p75'], lowerfence=filteredData['p10'], upperfence=filteredData['p90'],
+                             mean=filteredData['mean'], name='Rented Bike Count (p10-p90 whiskers)'))
+        fig.add_trace(go.Scatter(x=filteredData.index, y=filteredData['max'], name='Max', mode='markers'))
+    else:
+        # Puntos por WebGL (todos o una muestra que conserva los cuantiles de cada hora), con dispersión
+        # horizontal fija para que la figura sea la misma en cada render
+        hours, demand = cube.puntos(season, None if mode == 'crudo' else Historico.PRESUPUESTO_PUNTOS, **filters)
+        jitter = np.random.default_rng(0).uniform(-0.3, 0.3, len(hours))
+        name = 'Hourly observations' if mode == 'crudo' else f'Sample of {len(demand):,} of {rows:,} observations'
+        fig.add_trace(go.Scattergl(x=hours + jitter, y=demand, mode='markers', name=name,
+                                   marker={'size': 3, 'opacity': 0.3}))
+        fig.add_trace(go.Scatter(x=filteredData.index, y=filteredData['mean'], name='Mean Rented Bike Count',
+                                 mode='lines+markers'))
+        fig.add_trace(go.Scatter(x=filteredData.index, y=filteredData['median'], name='Median', mode='lines+markers'))
 
     fig.update_layout(xaxis_title='Hour',
                     yaxis_title='Rented Bike Count')
     return fig
 
+# Etapa compartida: la demanda se calcula una sola vez por clic y alimenta al precio y a la gráfica de costos
 @app.callback(
-    Output('outputPrice', 'children'),
+    Output('pricePrediction', 'data'),
     Input('buttonCalculatePrice', 'n_clicks'),
     State('hourSlider', 'value'),
     State('temperatureSlider', 'value'),
@@ -252,123 +372,63 @@ def updateHistoricDemand(season):
     State('dropdownSeason2', 'value'),
     State('fixedCost', 'value'),
     State('variableCost', 'value'),
-    State('profitability', 'value')
+    State('profitability', 'value'),
+    State('dropdownCity', 'value')
 )
-def updatePrice(n_clicks, hourSlider, temperatureSlider, humiditySlider, windSpeedSlider,
+@Metricas.instrumentar('app_callback_segundos')
+def updatePricePrediction(n_clicks, hourSlider, temperatureSlider, humiditySlider, windSpeedSlider,
                  dewPointTemperatureSlider, solarRadiationSlider, rainfallSlider, snowfallSlider,
-                 checkBoxDummies, dropdownSeason2, fixedCost, variableCost, profitability):
+                 checkBoxDummies, dropdownSeason2, fixedCost, variableCost, profitability,
+                 dropdownCity=Registro.CIUDAD_POR_DEFECTO):
+    if n_clicks == 0:
+        return None
+
+    prediction = {'functioning': 'Functioning Day' in checkBoxDummies, 'demand': 0, 'inf': 0, 'sup': 0,
+                  'fixedCost': fixedCost, 'variableCost': variableCost, 'profitability': profitability}
+    if prediction['functioning']:
+        entry = modelRegistry.entrada(dropdownCity)
+        x = entry['esquema'].desde_controles(hourSlider, temperatureSlider, humiditySlider,
+                                             windSpeedSlider, dewPointTemperatureSlider,
+                                             solarRadiationSlider, rainfallSlider, snowfallSlider,
+                                             checkBoxDummies, dropdownSeason2)
+        prediction['demand'], prediction['inf'], prediction['sup'] = Modelo.predict_one(x, artefacto=entry['artefacto'])
+        prediction['sigma'] = float(Modelo.error_prediccion(x, entry['artefacto'])[0])
+
+    return prediction
+
+@app.callback(
+    Output('outputPrice', 'children'),
+    Input('pricePrediction', 'data')
+)
+@Metricas.instrumentar('app_callback_segundos')
+def updatePrice(prediction):
     price = 0
     response = 'The sistem is on mantainance'
-    if n_clicks > 0:
-        if 'Functioning Day' in checkBoxDummies:
-            x = []
-            model = Modelo.modeloRLS()[0]
-            coef = model.coef_
-            demand = model.intercept_
-
-            x.append(hourSlider)
-            x.append(temperatureSlider)
-            x.append(humiditySlider)
-            x.append(windSpeedSlider)
-            x.append(dewPointTemperatureSlider)
-            x.append(solarRadiationSlider)
-            x.append(rainfallSlider)
-            x.append(snowfallSlider)
-            x.append(1 if 'Holiday' in checkBoxDummies else 0)
-            x.append(1)
-            if dropdownSeason2 == 'Spring':
-                x.append(1)
-                x.append(0)
-                x.append(0)
-            elif dropdownSeason2 == 'Summer':
-                x.append(0)
-                x.append(1)
-                x.append(0)
-            elif dropdownSeason2 == 'Winter':
-                x.append(0)
-                x.append(0)
-                x.append(1)
-            else:
-                x.append(0)
-                x.append(0)
-                x.append(0)
-
-            for i in range(len(coef)):
-                demand = demand + coef[i] * x[i]
-            
-            if demand > 0:
-                price = ((fixedCost + variableCost * demand) / (demand)) + profitability
-                response = f'{price:.2f}'
-            else:
-                response = 'The predicted demand is 0, the price can not be calculated'
+    if prediction is not None and prediction['functioning']:
+        demand = prediction['demand']
+
+        if demand > 0:
+            price = ((prediction['fixedCost'] + prediction['variableCost'] * demand) / (demand)) + prediction['profitability']
+            response = f'{price:.2f}'
+        else:
+            response = 'The predicted demand is 0, the price can not be calculated'
 
     return response
 
 @app.callback(
     Output('costDistribution', 'figure'),
-    Input('buttonCalculatePrice', 'n_clicks'),
-    State('hourSlider', 'value'),
-    State('temperatureSlider', 'value'),
-    State('humiditySlider', 'value'),
-    State('windSpeedSlider', 'value'),
-    State('dewPointTemperatureSlider', 'value'),
-    State('solarRadiationSlider', 'value'),
-    State('rainfallSlider', 'value'),
-    State('snowfallSlider', 'value'),
-    State('checkBoxDummies', 'value'),
-    State('dropdownSeason2', 'value'),
-    State('fixedCost', 'value'),
-    State('variableCost', 'value'),
-    State('profitability', 'value')
+    Input('pricePrediction', 'data')
 )
-def updateCostDistribution(n_clicks, hourSlider, temperatureSlider, humiditySlider, windSpeedSlider,
-                 dewPointTemperatureSlider, solarRadiationSlider, rainfallSlider, snowfallSlider,
-                 checkBoxDummies, dropdownSeason2, fixedCost, variableCost, profitability):
-    if n_clicks > 0:
-        demand = 0
-        if 'Functioning Day' in checkBoxDummies:
-            x = []
-            model = Modelo.modeloRLS()[0]
-            coef = model.coef_
-            demand = model.intercept_
-
-            x.append(hourSlider)
-            x.append(temperatureSlider)
-            x.append(humiditySlider)
-            x.append(windSpeedSlider)
-            x.append(dewPointTemperatureSlider)
-            x.append(solarRadiationSlider)
-            x.append(rainfallSlider)
-            x.append(snowfallSlider)
-            x.append(1 if 'Holiday' in checkBoxDummies else 0)
-            x.append(1)
-            if dropdownSeason2 == 'Spring':
-                x.append(1)
-                x.append(0)
-                x.append(0)
-            elif dropdownSeason2 == 'Summer':
-                x.append(0)
-                x.append(1)
-                x.append(0)
-            elif dropdownSeason2 == 'Winter':
-                x.append(0)
-                x.append(0)
-                x.append(1)
-            else:
-                x.append(0)
-                x.append(0)
-                x.append(0)
-
-            for i in range(len(coef)):
-                demand = demand + coef[i] * x[i]
-
-    if None in [fixedCost, variableCost]:
+@Metricas.instrumentar('app_callback_segundos')
+@Cache.cachear_figura(figureCache)
+def updateCostDistribution(prediction):
+    if prediction is None or None in [prediction['fixedCost'], prediction['variableCost']]:
         fig = go.Figure()  # Retorna una figura vacía si alguno de los inputs no es válido.
 
     else: 
         fig = go.Figure()
         fig.add_trace(go.Pie(labels=['Fixed Cost', 'Variable Cost'],
-                             values=[fixedCost, variableCost * demand]))
+                             values=[prediction['fixedCost'], prediction['variableCost'] * prediction['demand']]))
         fig.update_layout(
             title_text="Hour Expenses",
             title_x=0.5
@@ -376,5 +436,123 @@ def updateCostDistribution(n_clicks, hourSlider, temperatureSlider, humiditySlid
 
     return fig
     
+@app.callback(
+    Output('outputOptimalPrice', 'children'),
+    Output('profitSimulation', 'figure'),
+    Input('pricePrediction', 'data'),
+    Input('breakEvenTarget', 'value')
+)
+@Metricas.instrumentar('app_callback_segundos')
+def updateProfitSimulation(prediction, breakEvenTarget):
+    fig = go.Figure()
+    if (prediction is None or not prediction['functioning']
+            or None in [prediction['fixedCost'], prediction['variableCost'], prediction['profitability']]):
+        return '', fig
+
+    simulation = Simulacion.simular(prediction['demand'], prediction['sigma'], prediction['fixedCost'],
+                                    prediction['variableCost'], prediction['profitability'], objetivo=breakEvenTarget)
+    prices = simulation['precios']
+
+    fig.add_trace(go.Scatter(x=prices, y=simulation['probabilidad_cubrir'], name='P(cover costs)'))
+    fig.add_trace(go.Scatter(x=prices, y=simulation['ganancia_cuantiles'][:, 0], name='Profit p10',
+                             yaxis='y2', line={'width': 0}, showlegend=False))
+    fig.add_trace(go.Scatter(x=prices, y=simulation['ganancia_cuantiles'][:, 2], name='Profit p10-p90',
+                             yaxis='y2', line={'width': 0}, fill='tonexty'))
+    fig.add_trace(go.Scatter(x=prices, y=simulation['ganancia_media'], name='Expected profit', yaxis='y2'))
+    fig.update_layout(title_text='Profit Simulation', title_x=0.5, xaxis_title='Price per bike per hour',
+                      yaxis={'title': 'Probability of covering costs', 'range': [0, 1]},
+                      yaxis2={'title': 'Profit per hour', 'overlaying': 'y', 'side': 'right'})
+
+    if simulation['precio_optimo'] is None:
+        return 'The predicted demand is too uncertain to cover costs', fig
+    fig.add_vline(x=simulation['precio_optimo'], line_dash='dash')
+    return f"{simulation['precio_optimo']:.2f}", fig
+
+@app.callback(
+    Output('modelParameters', 'data'),
+    Input('dropdownCity', 'value'),
+    Input('modelVersionCheck', 'n_intervals'),
+    State('modelParameters', 'data')
+)
+@Metricas.instrumentar('app_callback_segundos')
+def updateModelParameters(dropdownCity, n_intervals, parameters):
+    # Solo se envían los coeficientes de nuevo si cambió la ciudad o se publicó otro modelo
+    if (parameters is not None and parameters['city'] == dropdownCity
+            and parameters['version'] == modelRegistry.version(dropdownCity)):
+        return dash.no_update
+    return modelRegistry.parametros_cliente(dropdownCity)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='prediccion', function_name='actualizar'),
+    Output('outputLiveDemand', 'children'),
+    Output('outputLivePrice', 'children'),
+    Output('liveCostDistribution', 'figure'),
+    Input('modelParameters', 'data'),
+    Input('predictionMode', 'value'),
+    Input('hourSlider', 'value'),
+    Input('temperatureSlider', 'value'),
+    Input('humiditySlider', 'value'),
+    Input('windSpeedSlider', 'value'),
+    Input('dewPointTemperatureSlider', 'value'),
+    Input('solarRadiationSlider', 'value'),
+    Input('rainfallSlider', 'value'),
+    Input('snowfallSlider', 'value'),
+    Input('checkBoxDummies', 'value'),
+    Input('dropdownSeason2', 'value'),
+    Input('fixedCost', 'value'),
+    Input('variableCost', 'value'),
+    Input('profitability', 'value')
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='prediccion', function_name='modo'),
+    Output('livePanel', 'style'),
+    Input('predictionMode', 'value')
+)
+
+@app.callback(
+    Output('forecastSummary', 'children'),
+    Output('forecastDemand', 'figure'),
+    Output('forecastPrice', 'figure'),
+    Input('forecastUpload', 'contents'),
+    State('forecastUpload', 'filename'),
+    State('dropdownCity', 'value'),
+    State('fixedCost', 'value'),
+    State('variableCost', 'value'),
+    State('profitability', 'value')
+)
+@Metricas.instrumentar('app_callback_segundos')
+def updateForecast(contents, filename, dropdownCity, fixedCost, variableCost, profitability):
+    demandFig, priceFig = go.Figure(), go.Figure()
+    if contents is None:
+        return '', demandFig, priceFig
+
+    costs = None
+    if None not in [fixedCost, variableCost, profitability]:
+        costs = {'fixedCost': fixedCost, 'variableCost': variableCost, 'profitability': profitability}
+    try:
+        forecastTable = Pronostico.leer_pronostico(base64.b64decode(contents.split(',', 1)[1]))
+        forecast = Pronostico.pronosticar(forecastTable, costs, dropdownCity)
+    except (ValueError, KeyError, pd.errors.ParserError) as e:
+        return f'{filename}: {e}', demandFig, priceFig
+
+    # Banda del intervalo de predicción alrededor de la demanda media de cada hora
+    demandFig.add_trace(go.Scatter(x=forecast['time'], y=forecast['upper'], line={'width': 0}, showlegend=False))
+    demandFig.add_trace(go.Scatter(x=forecast['time'], y=forecast['lower'], line={'width': 0}, fill='tonexty',
+                                   name=f'{Modelo.NIVEL_CONFIANZA:.0%} interval'))
+    demandFig.add_trace(go.Scatter(x=forecast['time'], y=forecast['mean'], name='Predicted demand'))
+    demandFig.update_layout(title_text='Forecast Demand', title_x=0.5, xaxis_title='Time', yaxis_title='Rented Bike Count')
+
+    if 'price' in forecast:
+        priceFig.add_trace(go.Bar(x=forecast['time'], y=forecast['price'], name='Suggested price'))
+        priceFig.update_layout(title_text='Suggested Price per Hour', title_x=0.5, xaxis_title='Time',
+                               yaxis_title='Price per bike per hour')
+
+    summary = f"{filename}: {len(forecast)} hours, total predicted demand {forecast['mean'].sum():,.0f} bikes"
+    if costs is None:
+        summary += ' (enter the costs above to get the suggested prices)'
+    return summary, demandFig, priceFig
+
 if __name__ == '__main__':
+    Reentrenamiento.obtener_servicio().iniciar()
     app.run_server(debug=True)
\ No newline at end of file
@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import time
+import inspect
+import argparse
+import platform
+import tempfile
+import subprocess
+import urllib.request
+import numpy as np
+import pandas as pd
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RUTA_BASE = os.path.join(DIRECTORIO, 'benchmark_base.json')
+ESCALAS = [1, 10, 100]
+UMBRAL = 1.25
+REPETICIONES = 20
+FILAS_LOTE = 100_000
+# Fracción máxima del RSS de un worker de gunicorn que puede ser memoria privada (no compartida con el maestro)
+FRACCION_PRIVADA = 0.3
+
+ESCENARIO = [10, 20, 50, 1, 5, 1, 0, 0, 0, 1, 0, 1, 0]
+SLIDERS = [10, 20, 50, 1, 5, 1, 0, 0, ['Functioning Day'], 'Summer']
+COSTOS = [100, 2, 0.5]
+
+def medir(funcion, repeticiones=REPETICIONES):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    tiempos = np.array(tiempos) * 1000
+    return {'mediana_ms': float(np.median(tiempos)), 'p95_ms': float(np.percentile(tiempos, 95))}
+
+def generar_datos(directorio, escala, semilla=0):
+    # Réplicas de los CSV originales con ruido en el clima y en la demanda
+    import Datos
+    rng = np.random.default_rng(semilla)
+    for ruta in [Datos.RUTA_LIMPIOS, Datos.RUTA_ORIGINALES]:
+        data = Datos.leer_csv(ruta)
+        sintetico = pd.concat([data] * escala, ignore_index=True)
+        if escala > 1:
+            for columna in ['Temperature(C)', 'Dew point temperature(C)']:
+                sintetico[columna] = (sintetico[columna] + rng.normal(0, 0.5, len(sintetico))).round(1)
+            demanda = sintetico['Rented Bike Count']
+            sintetico['Rented Bike Count'] = np.maximum(demanda + rng.normal(0, 20, len(sintetico)), 0).astype(int)
+        sintetico.to_csv(os.path.join(directorio, os.path.basename(ruta)), index=False)
+
+def medir_escala(repeticiones):
+    # Se ejecuta en un proceso hijo con DATOS_DIR y MODELO_CACHE apuntando a los datos sintéticos
+    resultados = {}
+
+    inicio = time.perf_counter()
+    import App
+    resultados['arranque_app_s'] = time.perf_counter() - inicio
+
+    import Datos
+    import Modelo
+
+    resultados['cargar_datos_csv'] = medir(lambda: Datos.leer_csv(Datos.RUTA_LIMPIOS), max(repeticiones // 4, 3))
+    resultados['cargar_datos'] = medir(lambda: Modelo.cargar_datos(Modelo.RUTA_DATOS), repeticiones)
+    resultados['entrenar'] = medir(lambda: Modelo.entrenar(Modelo.RUTA_DATOS), max(repeticiones // 4, 3))
+
+    def desde_disco():
+        Modelo._artefactos.clear()
+        Modelo.modeloRLS()
+    resultados['modeloRLS_disco'] = medir(desde_disco, repeticiones)
+    resultados['modeloRLS_memoria'] = medir(Modelo.modeloRLS, repeticiones)
+
+    resultados['predict_one'] = medir(lambda: Modelo.predict_one(ESCENARIO), repeticiones * 50)
+    lote = np.tile(np.array(ESCENARIO, dtype=np.float64), (FILAS_LOTE, 1))
+    lote_tiempo = medir(lambda: Modelo.predict_batch(lote), repeticiones)
+    resultados['predict_batch'] = dict(lote_tiempo, filas_por_s=FILAS_LOTE / (lote_tiempo['mediana_ms'] / 1000))
+
+    resultados['updateDemand'] = medir(lambda: App.updateDemand(1, *SLIDERS), repeticiones)
+    prediccion = App.updatePricePrediction(1, *SLIDERS, *COSTOS)
+    resultados['updatePricePrediction'] = medir(lambda: App.updatePricePrediction(1, *SLIDERS, *COSTOS), repeticiones)
+    resultados['updatePrice'] = medir(lambda: App.updatePrice(prediccion), repeticiones)
+    # Sin caché de figuras (construcción completa) y con caché (acierto)
+    resultados['updateCostDistribution'] = medir(lambda: inspect.unwrap(App.updateCostDistribution)(prediccion), repeticiones)
+    resultados['updateCostDistribution_cache'] = medir(lambda: App.updateCostDistribution(prediccion), repeticiones)
+    resultados['updateHistoricDemand'] = medir(lambda: inspect.unwrap(App.updateHistoricDemand)('Winter'), repeticiones)
+    resultados['updateHistoricDemand_cache'] = medir(lambda: App.updateHistoricDemand('Winter'), repeticiones)
+    return resultados
+
+def ejecutar(escalas, repeticiones):
+    resultados = {}
+    for escala in escalas:
+        with tempfile.TemporaryDirectory() as directorio:
+            generar_datos(directorio, escala)
+            entorno = dict(os.environ, DATOS_DIR=directorio, MODELO_CACHE=os.path.join(directorio, 'cache'))
+            salida = subprocess.run([sys.executable, os.path.abspath(__file__), '--interno', str(repeticiones)],
+                                    env=entorno, cwd=DIRECTORIO, capture_output=True, text=True, check=True)
+            resultados[str(escala)] = json.loads(salida.stdout.strip().splitlines()[-1])
+        print(f'Escala {escala}x completada', file=sys.stderr)
+    return {'plataforma': platform.platform(), 'python': platform.python_version(),
+            'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'), 'resultados': resultados}
+
+def _aplanar(resultados):
+    valores = {}
+    for escala, metricas in resultados.items():
+        for nombre, valor in metricas.items():
+            if isinstance(valor, dict):
+                valores[f'{escala}x/{nombre}'] = valor['mediana_ms']
+            elif nombre.endswith('_s'):
+                valores[f'{escala}x/{nombre}'] = valor
+    return valores
+
+def comparar(actual, base, umbral=UMBRAL):
+    # Regresión: tiempo actual mayor que umbral veces el de la línea base
+    actuales = _aplanar(actual['resultados'])
+    bases = _aplanar(base['resultados'])
+    regresiones = []
+    for nombre in sorted(actuales.keys() & bases.keys()):
+        proporcion = actuales[nombre] / bases[nombre] if bases[nombre] > 0 else 1.0
+        marca = 'REGRESIÓN' if proporcion > umbral else ''
+        print(f'{nombre:45s} {bases[nombre]:12.3f} {actuales[nombre]:12.3f} {proporcion:7.2f}x {marca}')
+        if proporcion > umbral:
+            regresiones.append(nombre)
+    return regresiones
+
+def memoria_proceso(pid):
+    # Memoria del proceso en KiB según /proc (solo Linux): privada = páginas no compartidas con otros procesos
+    valores = {}
+    with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+        for linea in f:
+            partes = linea.split()
+            if len(partes) >= 2 and partes[0].endswith(':') and partes[1].isdigit():
+                valores[partes[0][:-1]] = int(partes[1])
+    return {'rss': valores.get('Rss', 0), 'pss': valores.get('Pss', 0),
+            'privada': valores.get('Private_Clean', 0) + valores.get('Private_Dirty', 0)}
+
+def _hijos(pid):
+    with open(f'/proc/{pid}/task/{pid}/children', 'r') as f:
+        return [int(p) for p in f.read().split()]
+
+def _esperar(url, limite=120):
+    fin = time.time() + limite
+    while time.time() < fin:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as respuesta:
+                if respuesta.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.5)
+    raise TimeoutError(f'El servidor no respondió en {url}')
+
+def medir_memoria_workers(cantidades, puerto=8765, peticiones=20, precarga=True):
+    # Levanta Servidor:server con gunicorn para cada cantidad de workers y mide la memoria privada de cada uno.
+    # precarga=False arranca sin preload_app, como referencia de lo que cuesta cada worker sin compartir memoria
+    resultados = {}
+    entorno = dict(os.environ, PRECARGA='1' if precarga else '0')
+    escenarios = json.dumps([dict(hour=h, temperature=20, humidity=50, windSpeed=1, dewPointTemperature=5,
+                                  solarRadiation=1, rainfall=0, snowfall=0, season='Summer') for h in range(24)])
+    for n in cantidades:
+        proceso = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'Servidor:server', '--workers', str(n),
+                                    '--bind', f'127.0.0.1:{puerto}'], cwd=DIRECTORIO,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=entorno)
+        try:
+            _esperar(f'http://127.0.0.1:{puerto}/')
+            # Tráfico para que cada worker ejecute los caminos calientes antes de medir
+            for _ in range(peticiones * n):
+                peticion = urllib.request.Request(f'http://127.0.0.1:{puerto}/api/predict', data=escenarios.encode(),
+                                                  headers={'Content-Type': 'application/json'})
+                urllib.request.urlopen(peticion, timeout=10).read()
+                urllib.request.urlopen(f'http://127.0.0.1:{puerto}/_dash-layout', timeout=10).read()
+            memorias = [memoria_proceso(pid) for pid in _hijos(proceso.pid)]
+            resultados[str(n)] = {
+                'workers': len(memorias),
+                'privada_media_kib': float(np.mean([m['privada'] for m in memorias])),
+                'pss_media_kib': float(np.mean([m['pss'] for m in memorias])),
+                'rss_media_kib': float(np.mean([m['rss'] for m in memorias])),
+                'maestro': memoria_proceso(proceso.pid),
+            }
+        finally:
+            proceso.terminate()
+            proceso.wait(timeout=30)
+        print(f'{n} workers medidos', file=sys.stderr)
+    return resultados
+
+def verificar_memoria_workers(resultados, tolerancia=0.25, fraccion_privada=FRACCION_PRIVADA):
+    # Devuelve los problemas encontrados (lista vacía si no hay ninguno):
+    # - con preload la mayor parte del RSS de cada worker son páginas heredadas del maestro; si la memoria privada
+    #   pasa de fraccion_privada del RSS, cada worker cargó su propia copia de la aplicación
+    # - la memoria privada por worker debe mantenerse plana al aumentar la cantidad de workers
+    problemas = []
+    cantidades = sorted(resultados, key=int)
+    for n in cantidades:
+        proporcion = resultados[n]['privada_media_kib'] / resultados[n]['rss_media_kib']
+        if proporcion > fraccion_privada:
+            problemas.append(f'Con {n} workers la memoria privada es el {proporcion:.0%} del RSS de cada worker '
+                             f'(máximo {fraccion_privada:.0%}): la aplicación no se comparte desde el maestro')
+    referencia = resultados[cantidades[0]]['privada_media_kib']
+    maxima = max(resultados[n]['privada_media_kib'] for n in cantidades)
+    if maxima > referencia * (1 + tolerancia):
+        problemas.append('La memoria privada por worker crece con la cantidad de workers')
+    return problemas
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks del modelo y del tablero')
+    parser.add_argument('--escalas', type=int, nargs='+', default=ESCALAS)
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES)
+    parser.add_argument('--salida', default=None, help='Archivo JSON donde guardar los resultados')
+    parser.add_argument('--base', default=RUTA_BASE, help='Línea base contra la cual comparar')
+    parser.add_argument('--guardar-base', action='store_true', help='Guardar los resultados como nueva línea base')
+    parser.add_argument('--umbral', type=float, default=UMBRAL)
+    parser.add_argument('--memoria-workers', type=int, nargs='+', default=None,
+                        help='Medir la memoria por worker de gunicorn con estas cantidades de workers')
+    parser.add_argument('--tolerancia', type=float, default=0.25)
+    parser.add_argument('--interno', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.memoria_workers:
+        resultados = medir_memoria_workers(args.memoria_workers)
+        print(json.dumps(resultados, indent=2))
+        problemas = verificar_memoria_workers(resultados, args.tolerancia)
+        for problema in problemas:
+            print(problema, file=sys.stderr)
+        return 1 if problemas else 0
+
+    if args.interno is not None:
+        print(json.dumps(medir_escala(args.interno)))
+        return 0
+
+    actual = ejecutar(args.escalas, args.repeticiones)
+    texto = json.dumps(actual, indent=2)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+    if args.guardar_base:
+        with open(args.base, 'w', encoding='utf-8') as f:
+            f.write(texto)
+        return 0
+    if os.path.exists(args.base):
+        with open(args.base, 'r', encoding='utf-8') as f:
+            base = json.load(f)
+        if comparar(actual, base, args.umbral):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import os
+import json
+import hashlib
+import threading
+import functools
+from collections import OrderedDict
+import Datos
+
+# Backend de la caché de figuras: 'memoria' (por proceso) o 'archivos' (compartida entre workers)
+BACKEND = os.environ.get('CACHE_FIGURAS', 'memoria')
+CAPACIDAD = int(os.environ.get('CACHE_FIGURAS_CAPACIDAD', '256'))
+
+class CacheMemoria:
+    def __init__(self, capacidad=CAPACIDAD):
+        self.capacidad = capacidad
+        self._entradas = OrderedDict()
+        self._candado = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    def obtener(self, clave):
+        with self._candado:
+            valor = self._entradas.get(clave)
+            if valor is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def guardar(self, clave, valor):
+        with self._candado:
+            self._entradas[clave] = valor
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+                self.desalojos += 1
+
+    def estadisticas(self):
+        return {'aciertos': self.aciertos, 'fallos': self.fallos, 'desalojos': self.desalojos,
+                'entradas': len(self._entradas), 'capacidad': self.capacidad}
+
+# Cada entrada es un archivo; la fecha de modificación hace de marca de uso para el desalojo LRU
+class CacheArchivos:
+    def __init__(self, directorio=os.path.join(Datos.DIRECTORIO_CACHE, 'figuras'), capacidad=CAPACIDAD):
+        self.directorio = directorio
+        self.capacidad = capacidad
+        os.makedirs(directorio, exist_ok=True)
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f'{clave}.json')
+
+    def obtener(self, clave):
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, 'r', encoding='utf-8') as f:
+                valor = f.read()
+            os.utime(ruta)
+        except FileNotFoundError:
+            self.fallos += 1
+            return None
+        self.aciertos += 1
+        return valor
+
+    def guardar(self, clave, valor):
+        with Datos.escritura_atomica(self._ruta(clave)) as f:
+            f.write(valor)
+        self._desalojar()
+
+    def _desalojar(self):
+        entradas = []
+        with os.scandir(self.directorio) as it:
+            for e in it:
+                if e.name.endswith('.json'):
+                    try:
+                        entradas.append((e.stat().st_mtime_ns, e.path))
+                    except FileNotFoundError:
+                        pass
+        if len(entradas) <= self.capacidad:
+            return
+        entradas.sort()
+        for _, ruta in entradas[:len(entradas) - self.capacidad]:
+            try:
+                os.remove(ruta)
+                self.desalojos += 1
+            except FileNotFoundError:
+                # Otro worker ya la eliminó
+                pass
+
+    def estadisticas(self):
+        return {'aciertos': self.aciertos, 'fallos': self.fallos, 'desalojos': self.desalojos,
+                'entradas': sum(1 for n in os.listdir(self.directorio) if n.endswith('.json')),
+                'capacidad': self.capacidad}
+
+def crear_cache(backend=BACKEND, capacidad=CAPACIDAD):
+    if backend == 'memoria':
+        return CacheMemoria(capacidad)
+    if backend == 'archivos':
+        return CacheArchivos(capacidad=capacidad)
+    raise ValueError(f'Backend de caché desconocido: {backend}')
+
+def normalizar(valor):
+    # Entradas equivalentes (1 y 1.0, checklists en otro orden) deben producir la misma clave
+    if isinstance(valor, bool) or valor is None or isinstance(valor, str):
+        return valor
+    if isinstance(valor, (int, float)):
+        return int(valor) if float(valor).is_integer() else round(float(valor), 10)
+    if isinstance(valor, dict):
+        return {str(k): normalizar(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        valores = [normalizar(v) for v in valor]
+        if all(isinstance(v, str) for v in valores):
+            valores = sorted(valores)
+        return valores
+    return str(valor)
+
+def clave(*partes):
+    texto = json.dumps(normalizar(list(partes)), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+# Decorador para callbacks que devuelven una figura: se guarda la figura ya serializada.
+# version recibe los mismos argumentos que el callback y devuelve lo que identifica los datos que dibuja
+def cachear_figura(cache, version=None):
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args):
+            k = clave(funcion.__name__, version(*args) if version is not None else None, *args)
+            valor = cache.obtener(k)
+            if valor is None:
+                valor = funcion(*args).to_json()
+                cache.guardar(k, valor)
+            return json.loads(valor)
+        return envoltura
+    return decorador
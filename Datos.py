@@ -0,0 +1,368 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import contextlib
+import numpy as np
+import pandas as pd
+import Metricas
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+# Ubicación explícita de los datos; se puede sobreescribir con variables de entorno
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+DIRECTORIO_DATOS = os.environ.get('DATOS_DIR', DIRECTORIO)
+DIRECTORIO_CACHE = os.environ.get('MODELO_CACHE', os.path.join(DIRECTORIO, 'cache'))
+RUTA_LIMPIOS = os.path.join(DIRECTORIO_DATOS, os.environ.get('DATOS_LIMPIOS', 'SeoulBikeDataClean.csv'))
+RUTA_ORIGINALES = os.path.join(DIRECTORIO_DATOS, os.environ.get('DATOS_ORIGINALES', 'SeoulBikeData_utf8.csv'))
+DIRECTORIO_COLUMNAS = os.path.join(DIRECTORIO_CACHE, 'columnas')
+# Versión del formato de la caché columnar; una caché de otro formato se regenera
+FORMATO = 3
+
+# Tipos compactos por columna para los DataFrames que se mantienen en memoria
+CLIMA = ['Temperature(C)', 'Wind speed (m/s)', 'Dew point temperature(C)', 'Solar Radiation (MJ/m2)',
+         'Rainfall(mm)', 'Snowfall (cm)']
+ESQUEMA_ORIGINALES = {
+    'Date': 'category',
+    'Rented Bike Count': np.int16,
+    'Hour': np.int8,
+    'Humidity(%)': np.int8,
+    'Visibility (10m)': np.int16,
+    'Seasons': 'category',
+    'Holiday': 'category',
+    'Functioning Day': 'category',
+    **{c: np.float32 for c in CLIMA},
+}
+ESQUEMA_LIMPIOS = {
+    'Rented Bike Count': np.int16,
+    'Hour': np.int8,
+    'Humidity(%)': np.int8,
+    'Visibility (10m)': np.int16,
+    'Holiday': np.int8,
+    'Functioning Day': np.int8,
+    'Seasons_Spring': np.int8,
+    'Seasons_Summer': np.int8,
+    'Seasons_Winter': np.int8,
+    **{c: np.float32 for c in CLIMA},
+}
+# Columnas de los datos originales que usa el tablero
+COLUMNAS_HISTORICO = ['Seasons', 'Hour', 'Rented Bike Count']
+
+def hash_archivo(ruta):
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+def firma_archivo(ruta):
+    # Firma barata (mtime, tamaño) para no tener que calcular el hash en cada consulta
+    info = os.stat(ruta)
+    return (info.st_mtime_ns, info.st_size)
+
+@contextlib.contextmanager
+def escritura_atomica(ruta, modo='w', copiar=False, **opciones):
+    # Se escribe en un temporal junto a ruta y se reemplaza al terminar: otro proceso o hilo ve el archivo
+    # anterior o el nuevo completo, nunca uno a medias. Si la escritura falla ruta queda como estaba.
+    # Entrega el archivo abierto con modo, o la ruta del temporal con modo=None (p. ej. para SQLite).
+    # Con copiar el temporal parte de una copia de ruta (p. ej. para anexar con modo 'a')
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    temporal = f'{ruta}.{os.getpid()}.{threading.get_ident()}.tmp'
+    if os.path.exists(temporal):
+        # Resto de una escritura interrumpida
+        os.remove(temporal)
+    try:
+        if copiar and os.path.exists(ruta):
+            shutil.copyfile(ruta, temporal)
+        if modo is None:
+            yield temporal
+        else:
+            if 'b' not in modo:
+                opciones.setdefault('encoding', 'utf-8')
+            with open(temporal, modo, **opciones) as f:
+                yield f
+        os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+@contextlib.contextmanager
+def bloqueo_archivo(ruta):
+    # Bloqueo exclusivo entre procesos (p. ej. workers de gunicorn) sobre {ruta}.lock: solo uno reconstruye
+    # lo que hay en ruta y los demás esperan y usan lo que dejó en disco
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(f'{ruta}.lock', 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def resolver_derivado(ruta, ruta_datos, cargar, construir, guardar, forzar=False):
+    # Objeto derivado de ruta_datos (un dict con la firma y el hash de los datos) guardado en ruta: del disco si
+    # sirve para los datos actuales, si no se construye y se guarda. cargar devuelve None si el archivo es de otra
+    # versión; un archivo ilegible también se reconstruye. Entre workers de gunicorn solo uno construye; los demás
+    # esperan y cargan lo que dejó en disco
+    with bloqueo_archivo(ruta):
+        firma = firma_archivo(ruta_datos)
+        derivado = None
+        if not forzar and os.path.exists(ruta):
+            try:
+                derivado = cargar(ruta)
+            except Exception as e:
+                print(f'No se pudo leer {ruta}, se reconstruye: {e}')
+            if derivado is not None and tuple(derivado['firma']) != firma:
+                # El archivo se tocó: solo se reconstruye si su contenido cambió
+                if derivado['hash'] == hash_archivo(ruta_datos):
+                    derivado['firma'] = firma
+                    guardar(derivado, ruta)
+                else:
+                    derivado = None
+
+        if derivado is None:
+            derivado = construir()
+            guardar(derivado, ruta)
+        return derivado
+
+def leer_csv(origen, nombre=None, **opciones):
+    # Toda lectura de un CSV de datos pasa por aquí para quedar contada en /metrics (por archivo); origen puede
+    # ser una ruta o un objeto tipo archivo, y entonces nombre identifica el archivo
+    Metricas.incrementar('datos_lecturas_csv_total', archivo=nombre or os.path.basename(origen))
+    return pd.read_csv(origen, **opciones)
+
+def nombre_cache(ruta):
+    # Nombre legible más un hash de la ruta absoluta: dos archivos con el mismo nombre en directorios
+    # distintos (p. ej. dos ciudades) no comparten ni se pisan la caché
+    ruta = os.path.abspath(ruta)
+    nombre = os.path.splitext(os.path.basename(ruta))[0]
+    return f"{nombre}_{hashlib.sha256(ruta.encode('utf-8')).hexdigest()[:16]}"
+
+def _directorio_columnas(ruta):
+    return os.path.join(DIRECTORIO_COLUMNAS, nombre_cache(ruta))
+
+# Cada conversión escribe un directorio de versión nuevo (v<ns>-<pid>) dentro del directorio de la caché y lo
+# publica reemplazando el archivo 'actual', que nombra la versión vigente: un lector ve la versión anterior
+# completa o la nueva completa, nunca meta.json de una con columnas de otra. Las conversiones y los anexos
+# se serializan con bloqueo_archivo sobre el directorio de la caché.
+def _version_actual(base):
+    try:
+        with open(os.path.join(base, 'actual'), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def _meta_actual(base):
+    version = _version_actual(base)
+    if version is None:
+        return None
+    meta = _leer_meta(os.path.join(base, version))
+    return meta if meta is not None and meta.get('version') == version else None
+
+def _publicar_version(base, version):
+    anterior = _version_actual(base)
+    with escritura_atomica(os.path.join(base, 'actual')) as f:
+        f.write(version)
+    # Se conserva la versión anterior para los lectores que la estén leyendo; el resto (y los temporales de
+    # conversiones interrumpidas) se borra. Se llama con el bloqueo tomado, así no hay otra conversión en curso
+    for entrada in os.listdir(base):
+        directorio = os.path.join(base, entrada)
+        if entrada not in (version, anterior) and os.path.isdir(directorio):
+            shutil.rmtree(directorio, ignore_errors=True)
+
+def convertir(ruta):
+    # CSV -> un archivo binario plano por columna; las columnas de texto se guardan como códigos + categorías
+    base = _directorio_columnas(ruta)
+    with bloqueo_archivo(base):
+        # Otro proceso o hilo pudo haber convertido el mismo archivo mientras se esperaba el bloqueo
+        meta = _vigente(ruta, base, bloquear=False)
+        if meta is not None:
+            return meta
+
+        firma, huella = list(firma_archivo(ruta)), hash_archivo(ruta)
+        data = leer_csv(ruta)
+        version = f'v{time.time_ns()}-{os.getpid()}'
+        temporal = os.path.join(base, f'{version}.tmp')
+        os.makedirs(temporal)
+
+        columnas = []
+        for i, nombre in enumerate(data.columns):
+            serie = data[nombre]
+            columna = {'nombre': nombre, 'archivo': f'{i}.bin'}
+            if serie.dtype == object or isinstance(serie.dtype, pd.StringDtype):
+                categorias = pd.Categorical(serie)
+                columna['categorias'] = [str(c) for c in categorias.categories]
+                valores = categorias.codes
+            else:
+                valores = serie.to_numpy()
+            columna['tipo'] = valores.dtype.str
+            valores.tofile(os.path.join(temporal, columna['archivo']))
+            columnas.append(columna)
+
+        meta = {'formato': FORMATO, 'version': version, 'fuente': ruta, 'hash': huella, 'firma': firma,
+                'filas': len(data), 'columnas': columnas}
+        _guardar_meta(temporal, meta)
+        os.replace(temporal, os.path.join(base, version))
+        _publicar_version(base, version)
+        return meta
+
+def anexar(ruta, nuevos, sellar=True):
+    # Agrega filas a la caché columnar de ruta sin volver a leer el CSV. Las filas quedan pendientes (invisibles
+    # para cargar) hasta que sellar_cache comprueba que el CSV ya las contiene y las publica.
+    # Devuelve False si la caché no existe o no admite anexar (columnas de texto o distintas), y hay que convertir.
+    base = _directorio_columnas(ruta)
+    with bloqueo_archivo(base):
+        meta = _meta_actual(base)
+        if meta is None or [c['nombre'] for c in meta['columnas']] != list(nuevos.columns):
+            return False
+        if any('categorias' in c for c in meta['columnas']):
+            return False
+
+        destino = os.path.join(base, meta['version'])
+        pendientes = meta.get('pendientes', 0)
+        for columna in meta['columnas']:
+            tipo = np.dtype(columna['tipo'])
+            valores = nuevos[columna['nombre']].to_numpy().astype(tipo, copy=False)
+            with open(os.path.join(destino, columna['archivo']), 'r+b') as f:
+                # Se escribe justo después de las filas ya anexadas, descartando restos de una escritura interrumpida
+                f.seek((meta['filas'] + pendientes) * tipo.itemsize)
+                valores.tofile(f)
+                f.truncate()
+        meta['pendientes'] = pendientes + len(nuevos)
+        _guardar_meta(destino, meta)
+    if sellar:
+        return sellar_cache(ruta)
+    return True
+
+def filas_csv(ruta):
+    # Filas de datos de un CSV sin saltos de línea entre comillas (sin contar el encabezado)
+    lineas, ultimo = 0, b'\n'
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            lineas += bloque.count(b'\n')
+            ultimo = bloque[-1:]
+    return max(lineas + (ultimo != b'\n') - 1, 0)
+
+def sellar_cache(ruta):
+    # Publica las filas pendientes de anexar y registra el hash y la firma actuales de ruta, solo si la caché
+    # queda con las mismas filas que el CSV; si no, descarta las pendientes y devuelve False (la caché deja de
+    # valer cuando cambia el CSV y se reconvierte)
+    base = _directorio_columnas(ruta)
+    with bloqueo_archivo(base):
+        meta = _meta_actual(base)
+        if meta is None:
+            return False
+        filas = meta['filas'] + meta.pop('pendientes', 0)
+        try:
+            firma, huella, completa = list(firma_archivo(ruta)), hash_archivo(ruta), filas_csv(ruta) == filas
+        except FileNotFoundError:
+            completa = False
+        if completa:
+            meta.update(filas=filas, hash=huella, firma=firma)
+        _guardar_meta(os.path.join(base, meta['version']), meta)
+        return completa
+
+def _guardar_meta(destino, meta):
+    with escritura_atomica(os.path.join(destino, 'meta.json')) as f:
+        json.dump(meta, f)
+
+def _leer_meta(destino):
+    try:
+        with open(os.path.join(destino, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return meta if meta.get('formato') == FORMATO else None
+
+def _vigente(ruta, base, bloquear=True):
+    meta = _meta_actual(base)
+    if meta is None:
+        return None
+    firma = list(firma_archivo(ruta))
+    if meta['firma'] == firma:
+        return meta
+    # El archivo se tocó: la caché sigue sirviendo si el contenido es el mismo, y se registra la firma nueva
+    if meta['hash'] != hash_archivo(ruta):
+        return None
+    if bloquear:
+        with bloqueo_archivo(base):
+            return _vigente(ruta, base, bloquear=False)
+    meta['firma'] = firma
+    _guardar_meta(os.path.join(base, meta['version']), meta)
+    return meta
+
+def cache_vigente(ruta):
+    return _vigente(ruta, _directorio_columnas(ruta))
+
+def _leer_columna(destino, columna, filas, mmap):
+    tipo = np.dtype(columna['tipo'])
+    ruta = os.path.join(destino, columna['archivo'])
+    if filas == 0:
+        return np.empty(0, dtype=tipo)
+    if mmap:
+        return np.memmap(ruta, dtype=tipo, mode='r', shape=(filas,))
+    return np.fromfile(ruta, dtype=tipo, count=filas)
+
+def _compactar(valores, tipo, nombre):
+    if tipo == 'category':
+        return valores if isinstance(valores, pd.Categorical) else pd.Categorical(valores)
+    valores = np.asarray(valores)
+    tipo = np.dtype(tipo)
+    if tipo.kind in 'iu' and valores.size:
+        limites = np.iinfo(tipo)
+        if valores.min() < limites.min or valores.max() > limites.max:
+            raise ValueError(f'La columna {nombre} no cabe en {tipo}')
+    return valores.astype(tipo, copy=False)
+
+def cargar(ruta, mmap=True, columnas=None, esquema=None):
+    # Con columnas solo se leen esos archivos; con esquema cada columna se convierte a su tipo compacto
+    base = _directorio_columnas(ruta)
+    for intento in range(2):
+        meta = cache_vigente(ruta) or convertir(ruta)
+        disponibles = {c['nombre']: c for c in meta['columnas']}
+        if columnas is None:
+            columnas = list(disponibles)
+        faltantes = [c for c in columnas if c not in disponibles]
+        if faltantes:
+            raise KeyError(f'Columnas inexistentes en {ruta}: {faltantes}')
+
+        try:
+            resultado = {}
+            for nombre in columnas:
+                columna = disponibles[nombre]
+                valores = _leer_columna(os.path.join(base, meta['version']), columna, meta['filas'], mmap)
+                if 'categorias' in columna:
+                    valores = pd.Categorical.from_codes(valores, columna['categorias'])
+                if esquema is not None and nombre in esquema:
+                    valores = _compactar(valores, esquema[nombre], nombre)
+                resultado[nombre] = valores
+        except FileNotFoundError:
+            # Dos conversiones seguidas borraron la versión que se estaba leyendo: se lee la vigente
+            if intento:
+                raise
+            continue
+        return pd.DataFrame(resultado, copy=False)
+
+def uso_memoria(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+def reporte_memoria(ruta, columnas=None, esquema=None):
+    completo = uso_memoria(leer_csv(ruta))
+    compacto = uso_memoria(cargar(ruta, mmap=False, columnas=columnas, esquema=esquema))
+    return {'archivo': os.path.basename(ruta), 'completo': completo, 'compacto': compacto,
+            'ahorro': completo - compacto, 'proporcion': compacto / completo}
+
+if __name__ == '__main__':
+    for ruta, columnas, esquema in [(RUTA_LIMPIOS, None, ESQUEMA_LIMPIOS),
+                                    (RUTA_ORIGINALES, COLUMNAS_HISTORICO, ESQUEMA_ORIGINALES)]:
+        r = reporte_memoria(ruta, columnas, esquema)
+        print(f"{r['archivo']}: {r['completo'] / 1024:.1f} KiB -> {r['compacto'] / 1024:.1f} KiB "
+              f"({r['proporcion']:.1%}, ahorro {r['ahorro'] / 1024:.1f} KiB)")
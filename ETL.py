@@ -0,0 +1,156 @@
+import os
+import json
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+import Datos
+import Metricas
+
+TAMANO_BLOQUE = 100_000
+# Bytes al final de la parte ya procesada cuyo hash se guarda para detectar que la fuente no fue reescrita
+TAMANO_TESTIGO = 1 << 16
+DIRECTORIO_ESTADO = os.path.join(Datos.DIRECTORIO_CACHE, 'etl')
+
+# Tipos de las columnas del CSV original; fijarlos evita que un bloque sin decimales salga como entero
+TIPOS_ORIGINALES = {
+    'Date': str,
+    'Rented Bike Count': np.int64,
+    'Hour': np.int64,
+    'Temperature(C)': np.float64,
+    'Humidity(%)': np.int64,
+    'Wind speed (m/s)': np.float64,
+    'Visibility (10m)': np.int64,
+    'Dew point temperature(C)': np.float64,
+    'Solar Radiation (MJ/m2)': np.float64,
+    'Rainfall(mm)': np.float64,
+    'Snowfall (cm)': np.float64,
+    'Seasons': str,
+    'Holiday': str,
+    'Functioning Day': str,
+}
+COLUMNAS_NUMERICAS = ['Rented Bike Count', 'Hour', 'Temperature(C)', 'Humidity(%)', 'Wind speed (m/s)',
+                      'Visibility (10m)', 'Dew point temperature(C)', 'Solar Radiation (MJ/m2)', 'Rainfall(mm)',
+                      'Snowfall (cm)']
+# One-hot de Seasons sin la categoría de referencia (Autumn), como en SeoulBikeDataClean.csv
+ESTACIONES = ['Spring', 'Summer', 'Winter']
+
+def transformar(bloque):
+    limpio = bloque[COLUMNAS_NUMERICAS].copy()
+    limpio['Holiday'] = (bloque['Holiday'] == 'Holiday').astype(np.int64)
+    limpio['Functioning Day'] = (bloque['Functioning Day'] == 'Yes').astype(np.int64)
+    for estacion in ESTACIONES:
+        limpio[f'Seasons_{estacion}'] = (bloque['Seasons'] == estacion).astype(np.int64)
+    return limpio
+
+class _Tramo:
+    # Vista de solo lectura de los bytes [inicio, fin) de un archivo, para no leer filas a medio escribir
+    def __init__(self, archivo, inicio, fin):
+        self.archivo = archivo
+        self.restante = fin - inicio
+        archivo.seek(inicio)
+
+    def read(self, tamano=-1):
+        if tamano is None or tamano < 0 or tamano > self.restante:
+            tamano = self.restante
+        datos = self.archivo.read(tamano)
+        self.restante -= len(datos)
+        return datos
+
+    def __iter__(self):
+        return iter(lambda: self.read(1 << 20), b'')
+
+def _fin_filas_completas(ruta):
+    # Posición justo después del último salto de línea del archivo
+    tamano = os.path.getsize(ruta)
+    with open(ruta, 'rb') as f:
+        posicion = tamano
+        while posicion > 0:
+            inicio = max(posicion - TAMANO_TESTIGO, 0)
+            f.seek(inicio)
+            bloque = f.read(posicion - inicio)
+            indice = bloque.rfind(b'\n')
+            if indice >= 0:
+                return inicio + indice + 1
+            posicion = inicio
+    return 0
+
+def _testigo(ruta, fin):
+    with open(ruta, 'rb') as f:
+        f.seek(max(fin - TAMANO_TESTIGO, 0))
+        return hashlib.sha256(f.read(min(fin, TAMANO_TESTIGO))).hexdigest()
+
+def _ruta_estado(salida):
+    return os.path.join(DIRECTORIO_ESTADO, Datos.nombre_cache(salida) + '.json')
+
+def _leer_estado(fuente, salida):
+    try:
+        with open(_ruta_estado(salida), 'r', encoding='utf-8') as f:
+            estado = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    # Solo se continúa si la fuente creció sin reescribirse y la salida sigue siendo la que se produjo
+    if (estado['fuente'] != os.path.abspath(fuente) or not os.path.exists(salida)
+            or os.path.getsize(fuente) < estado['bytes'] or os.path.getsize(salida) != estado['bytes_salida']
+            or _testigo(fuente, estado['bytes']) != estado['testigo']):
+        return None
+    return estado
+
+def _guardar_estado(salida, estado):
+    with Datos.escritura_atomica(_ruta_estado(salida)) as f:
+        json.dump(estado, f)
+
+def ejecutar(fuente=Datos.RUTA_ORIGINALES, salida=Datos.RUTA_LIMPIOS, tamano_bloque=TAMANO_BLOQUE, completo=False):
+    # Procesa la fuente por bloques de tamaño acotado; sin completo solo transforma las filas nuevas
+    estado = None if completo else _leer_estado(fuente, salida)
+    fin = _fin_filas_completas(fuente)
+
+    # En modo incremental la caché columnar de la salida se extiende bloque a bloque, si está al día
+    cache_columnar = False
+    if estado is not None:
+        meta = Datos.cache_vigente(salida)
+        if meta is not None and meta.get('pendientes'):
+            # Filas anexadas por una pasada interrumpida que nunca llegaron al CSV
+            Datos.sellar_cache(salida)
+            meta = Datos.cache_vigente(salida)
+        cache_columnar = meta is not None and meta['filas'] == estado['filas']
+
+    with open(fuente, 'rb') as f:
+        columnas = f.readline().decode('utf-8').strip().split(',')
+        inicio = estado['bytes'] if estado is not None else f.tell()
+        filas = estado['filas'] if estado is not None else 0
+        nuevas = 0
+
+        # La salida se reemplaza al terminar: una pasada completa la reescribe y una incremental anexa a una copia,
+        # así los workers que la leen nunca ven filas a medio escribir
+        with Datos.escritura_atomica(salida, 'w' if estado is None else 'a', copiar=estado is not None,
+                                     newline='') as destino:
+            if estado is None:
+                destino.write(','.join(transformar(pd.DataFrame(columns=columnas)).columns) + '\n')
+            if fin > inicio:
+                lector = Datos.leer_csv(_Tramo(f, inicio, fin), os.path.basename(fuente), header=None,
+                                        names=columnas, dtype=TIPOS_ORIGINALES, chunksize=tamano_bloque)
+                for bloque in lector:
+                    limpio = transformar(bloque)
+                    limpio.to_csv(destino, index=False, header=False, lineterminator='\n')
+                    nuevas += len(limpio)
+                    Metricas.incrementar('etl_filas_total', len(limpio))
+                    if cache_columnar:
+                        cache_columnar = Datos.anexar(salida, limpio, sellar=False)
+
+    # Las filas anexadas a la caché se publican solo si coinciden con las del CSV ya reemplazado
+    if cache_columnar and nuevas:
+        Datos.sellar_cache(salida)
+
+    _guardar_estado(salida, {'fuente': os.path.abspath(fuente), 'bytes': fin, 'filas': filas + nuevas,
+                             'bytes_salida': os.path.getsize(salida), 'testigo': _testigo(fuente, fin)})
+    return {'filas_nuevas': nuevas, 'filas': filas + nuevas, 'completo': estado is None}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ETL por bloques del CSV original al CSV listo para el modelo')
+    parser.add_argument('fuente', nargs='?', default=Datos.RUTA_ORIGINALES)
+    parser.add_argument('salida', nargs='?', default=Datos.RUTA_LIMPIOS)
+    parser.add_argument('--bloque', type=int, default=TAMANO_BLOQUE, help='Filas por bloque')
+    parser.add_argument('--completo', action='store_true', help='Reprocesar toda la fuente')
+    args = parser.parse_args()
+    print(json.dumps(ejecutar(args.fuente, args.salida, args.bloque, args.completo)))
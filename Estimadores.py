@@ -0,0 +1,224 @@
+import os
+import time
+import pickle
+import argparse
+import tracemalloc
+import numpy as np
+import pandas as pd
+import sklearn
+import sklearn.linear_model as lm
+from sklearn.base import clone
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+import Datos
+import Evaluacion
+import Modelo
+
+# Backends intercambiables con un mismo contrato de predicción:
+#   ajustar(X, y, X_cal, y_cal) -> self
+#   predecir(X, nivel) -> (media, inf, sup) para un lote
+#   predecir_uno(x, nivel) -> (media, inf, sup) como floats
+# OLS conserva el intervalo exacto de Modelo; el resto usa intervalos conformales: cuantiles de los residuos
+# del conjunto de calibración (la partición de prueba de Modelo), escalados por media^(potencia/2) para que
+# el ancho crezca con la demanda en los modelos de conteo.
+class Estimador:
+    potencia = 0
+
+    def __init__(self, nombre, modelo, potencia=None):
+        self.nombre = nombre
+        self.modelo = modelo
+        if potencia is not None:
+            self.potencia = potencia
+        self.residuos = None
+        self.columnas = None
+
+    def _escala(self, media):
+        if not self.potencia:
+            return np.ones_like(media)
+        return np.maximum(media, 1.0) ** (self.potencia / 2)
+
+    def ajustar(self, X, y, X_cal, y_cal):
+        self.columnas = np.asarray(X.columns, dtype=str) if isinstance(X, pd.DataFrame) else None
+        self.modelo = clone(self.modelo).fit(np.asarray(X, dtype=np.float64), np.asarray(y, dtype=np.float64))
+        media = self.modelo.predict(np.asarray(X_cal, dtype=np.float64))
+        self.residuos = np.sort((np.asarray(y_cal, dtype=np.float64) - media) / self._escala(media))
+        return self
+
+    def predecir(self, X, nivel=Modelo.NIVEL_CONFIANZA):
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        media = self.modelo.predict(X)
+        bajo, alto = np.quantile(self.residuos, [(1 - nivel) / 2, (1 + nivel) / 2])
+        escala = self._escala(media)
+        # La demanda no puede ser negativa
+        return media, np.maximum(media + bajo * escala, 0), media + alto * escala
+
+    def predecir_uno(self, x, nivel=Modelo.NIVEL_CONFIANZA):
+        media, inf, sup = self.predecir(np.asarray(x, dtype=np.float64).reshape(1, -1), nivel)
+        return float(media[0]), float(inf[0]), float(sup[0])
+
+    def tamano(self):
+        return len(pickle.dumps(self))
+
+class EstimadorOLS(Estimador):
+    def __init__(self, nombre='ols'):
+        super().__init__(nombre, lm.LinearRegression())
+
+    def ajustar(self, X, y, X_cal, y_cal):
+        self.columnas = np.asarray(X.columns, dtype=str) if isinstance(X, pd.DataFrame) else None
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        self.modelo = clone(self.modelo).fit(X, y)
+        # Mismos parámetros del intervalo exacto que el artefacto de Modelo.entrenar
+        Xa = np.column_stack([np.ones(len(X)), X])
+        residuos = y - self.modelo.predict(X)
+        self.gl = float(Xa.shape[0] - Xa.shape[1])
+        self.parametros = {'xtx_inv': np.linalg.inv(Xa.T @ Xa), 's2': float(residuos @ residuos / self.gl)}
+        return self
+
+    def predecir(self, X, nivel=Modelo.NIVEL_CONFIANZA):
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        media = self.modelo.predict(X)
+        margen = Modelo.valor_t(nivel, self.gl) * Modelo.error_estandar(X, self.parametros)
+        return media, media - margen, media + margen
+
+BACKENDS = {
+    'ols': lambda: EstimadorOLS(),
+    'ridge': lambda: Estimador('ridge', make_pipeline(StandardScaler(), lm.Ridge(alpha=1.0))),
+    'poisson': lambda: Estimador('poisson', make_pipeline(StandardScaler(),
+                                                          lm.PoissonRegressor(alpha=1e-4, max_iter=1000)), potencia=1),
+    'tweedie': lambda: Estimador('tweedie', make_pipeline(StandardScaler(),
+                                                          lm.TweedieRegressor(power=1.5, link='log', alpha=1e-4,
+                                                                              max_iter=1000)), potencia=1.5),
+    'hgb': lambda: Estimador('hgb', HistGradientBoostingRegressor(loss='poisson', random_state=0), potencia=1),
+}
+
+def crear(nombre):
+    if nombre not in BACKENDS:
+        raise ValueError(f'Backend desconocido: {nombre}. Disponibles: {list(BACKENDS)}')
+    return BACKENDS[nombre]()
+
+# Backends que el servidor ajusta al arrancar y mantiene al día el hilo de reentrenamiento (ver
+# Reentrenamiento.py); ?backend= solo acepta estos. Ninguna petición ajusta un estimador. Por defecto solo OLS:
+# el resto se activa con ESTIMADORES=ols,ridge,... porque cada uno alarga el arranque en frío (hgb, varios segundos)
+SERVIDOS = [b for b in os.environ.get('ESTIMADORES', 'ols').split(',') if b]
+DIRECTORIO = os.path.join(Datos.DIRECTORIO_CACHE, 'estimadores')
+# Un pickle de otra versión de este módulo o de sklearn se vuelve a ajustar en lugar de cargarse
+VERSION = 1
+
+# Estimadores publicados en este proceso por (nombre, datos): {'firma', 'hash', 'estimador'}
+_ajustados = {}
+
+def _ruta(nombre, ruta_datos):
+    return os.path.join(DIRECTORIO, f'{nombre}_{Datos.nombre_cache(ruta_datos)}.pkl')
+
+def _guardar(ajustado, ruta):
+    with Datos.escritura_atomica(ruta, 'wb') as f:
+        pickle.dump(ajustado, f)
+
+def _cargar(ruta):
+    # Archivo propio de la caché local, escrito por _guardar
+    with open(ruta, 'rb') as f:
+        ajustado = pickle.load(f)
+    if ajustado.get('version') != (VERSION, sklearn.__version__):
+        return None
+    return ajustado
+
+def _ajustar(nombre, ruta_datos):
+    firma, huella = Datos.firma_archivo(ruta_datos), Datos.hash_archivo(ruta_datos)
+    X_new, Y_new, (X_train, X_test, Y_train, Y_test) = Modelo.particion(ruta_datos)
+    return {'version': (VERSION, sklearn.__version__), 'firma': firma, 'hash': huella,
+            'estimador': crear(nombre).ajustar(X_train, Y_train, X_test, Y_test)}
+
+def _resolver(nombre, ruta_datos, forzar=False):
+    # Igual que el artefacto de Modelo (ver Datos.resolver_derivado)
+    return Datos.resolver_derivado(_ruta(nombre, ruta_datos), ruta_datos, _cargar,
+                                   lambda: _ajustar(nombre, ruta_datos), _guardar, forzar)
+
+def preparar(nombres=None, ruta_datos=Modelo.RUTA_DATOS):
+    # Al arrancar (en el maestro con preload_app): carga o ajusta cada backend servido
+    for nombre in (SERVIDOS if nombres is None else nombres):
+        crear(nombre)
+        _ajustados[(nombre, ruta_datos)] = _resolver(nombre, ruta_datos)
+
+def obtener(nombre, ruta_datos=Modelo.RUTA_DATOS):
+    # Camino de las peticiones: devuelve el estimador publicado, aunque sus datos ya hayan cambiado y el
+    # reajuste siga pendiente en segundo plano
+    crear(nombre)
+    ajustado = _ajustados.get((nombre, ruta_datos))
+    if ajustado is None:
+        raise ValueError(f'El backend {nombre} no está disponible en este servidor. Servidos: '
+                         f'{sorted(n for n, r in _ajustados if r == ruta_datos)}')
+    return ajustado['estimador']
+
+def reentrenar(forzar=False):
+    # Desde el hilo de reentrenamiento: reajusta los backends cuyos datos cambiaron y los publica con una sola
+    # asignación. Devuelve los nombres reajustados
+    reajustados = []
+    for (nombre, ruta_datos), ajustado in list(_ajustados.items()):
+        if forzar or ajustado['firma'] != Datos.firma_archivo(ruta_datos):
+            nuevo = _resolver(nombre, ruta_datos, forzar)
+            if forzar or nuevo['hash'] != ajustado['hash']:
+                reajustados.append(nombre)
+            _ajustados[(nombre, ruta_datos)] = nuevo
+    return reajustados
+
+def evaluar(nombre, ruta_datos=Modelo.RUTA_DATOS, repeticiones=None, filas_lote=10_000,
+            pliegues=5, esquema='kfold', procesos=None, nivel=Modelo.NIVEL_CONFIANZA):
+    # Herramienta de desarrollo: Benchmark no se importa en el camino del servidor
+    import Benchmark
+    repeticiones = repeticiones or Benchmark.REPETICIONES
+    X_new, Y_new, (X_train, X_test, Y_train, Y_test) = Modelo.particion(ruta_datos)
+    # La mitad de la partición de prueba calibra los intervalos y la otra mide su cobertura
+    mitad = len(X_test) // 2
+    X_cal, y_cal, X_test, Y_test = X_test[:mitad], Y_test[:mitad], X_test[mitad:], Y_test[mitad:]
+    resultado = {'backend': nombre}
+
+    inicio = time.perf_counter()
+    estimador = crear(nombre).ajustar(X_train, Y_train, X_cal, y_cal)
+    resultado['ajuste_s'] = time.perf_counter() - inicio
+
+    # Pico de memoria del ajuste en un segundo ajuste, para no contaminar el tiempo con tracemalloc
+    tracemalloc.start()
+    crear(nombre).ajustar(X_train, Y_train, X_cal, y_cal)
+    resultado['memoria_ajuste_bytes'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    resultado['tamano_bytes'] = estimador.tamano()
+
+    X_prueba = X_test.to_numpy(dtype=np.float64)
+    fila = X_prueba[0].copy()
+    uno = Benchmark.medir(lambda: estimador.predecir_uno(fila, nivel), repeticiones * 50)
+    resultado['uno_mediana_ms'], resultado['uno_p95_ms'] = uno['mediana_ms'], uno['p95_ms']
+    lote = np.resize(X_prueba, (filas_lote, X_prueba.shape[1]))
+    resultado['lote_mediana_ms'] = Benchmark.medir(lambda: estimador.predecir(lote, nivel), repeticiones)['mediana_ms']
+    resultado['filas_por_s'] = filas_lote / (resultado['lote_mediana_ms'] / 1000)
+
+    # Calidad: validación cruzada de la media (reutiliza Evaluacion y su caché) y cobertura del intervalo
+    cv = Evaluacion.validacion_cruzada(X_new, Y_new, estimador.modelo, pliegues, esquema, procesos).mean()
+    resultado.update({f'cv_{m}': float(cv[m]) for m in ['MAE', 'RMSE', 'R2']})
+    media, inf, sup = estimador.predecir(X_prueba, nivel)
+    y = Y_test.to_numpy(dtype=np.float64)
+    resultado['cobertura'] = float(np.mean((y >= inf) & (y <= sup)))
+    resultado['negativas'] = float(np.mean(media < 0))
+    return resultado
+
+def comparar(nombres=None, presupuesto_ms=None, **opciones):
+    tabla = pd.DataFrame([evaluar(nombre, **opciones) for nombre in (nombres or list(BACKENDS))]).set_index('backend')
+    if presupuesto_ms is not None:
+        tabla['dentro_presupuesto'] = tabla['uno_p95_ms'] <= presupuesto_ms
+    return tabla
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tiempo, memoria y error de cada backend de estimación')
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument('--repeticiones', type=int, default=None)
+    parser.add_argument('--pliegues', type=int, default=5)
+    parser.add_argument('--esquema', default='kfold', choices=['kfold', 'temporal'])
+    parser.add_argument('--presupuesto-ms', type=float, default=None,
+                        help='Latencia p95 máxima de una predicción individual')
+    argumentos = parser.parse_args()
+
+    tabla = comparar(argumentos.backends, argumentos.presupuesto_ms, repeticiones=argumentos.repeticiones,
+                     pliegues=argumentos.pliegues, esquema=argumentos.esquema)
+    with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.float_format', '{:.4g}'.format):
+        print(tabla.T)
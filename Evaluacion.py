@@ -0,0 +1,102 @@
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import sklearn.linear_model as lm
+import sklearn.metrics as metrics
+from sklearn.base import clone
+from sklearn.model_selection import KFold, TimeSeriesSplit
+import Datos
+import Modelo
+
+METRICAS = ['MAE', 'MSE', 'RMSE', 'R2']
+DIRECTORIO_EVALUACION = os.path.join(Datos.DIRECTORIO_CACHE, 'evaluacion')
+
+def _particiones(esquema, pliegues):
+    # 'kfold' reproduce los pliegues de cross_val_score(cv=k) que usa el notebook
+    if esquema == 'kfold':
+        return KFold(n_splits=pliegues)
+    if esquema == 'temporal':
+        return TimeSeriesSplit(n_splits=pliegues)
+    raise ValueError(f'Esquema de validación desconocido: {esquema}')
+
+def _evaluar_pliegue(estimador, X, y, entrenamiento, prueba):
+    # Un solo ajuste por pliegue y todas las métricas sobre la misma predicción
+    modelo = clone(estimador).fit(X[entrenamiento], y[entrenamiento])
+    y_pred = modelo.predict(X[prueba])
+    mse = metrics.mean_squared_error(y[prueba], y_pred)
+    return {
+        'MAE': float(metrics.mean_absolute_error(y[prueba], y_pred)),
+        'MSE': float(mse),
+        'RMSE': float(np.sqrt(mse)),
+        'R2': float(metrics.r2_score(y[prueba], y_pred)),
+    }
+
+def _firma_configuracion(estimador, X, y, columnas, esquema, pliegues):
+    h = hashlib.sha256()
+    h.update(np.ascontiguousarray(X).tobytes())
+    h.update(np.ascontiguousarray(y).tobytes())
+    h.update(json.dumps([list(columnas), esquema, pliegues, type(estimador).__module__, type(estimador).__name__,
+                         sorted((k, repr(v)) for k, v in estimador.get_params().items())]).encode('utf-8'))
+    return h.hexdigest()
+
+def _leer_cache(ruta):
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _guardar_cache(ruta, resultado):
+    with Datos.escritura_atomica(ruta) as f:
+        json.dump(resultado, f)
+
+def validacion_cruzada(X, y, estimador=None, pliegues=5, esquema='kfold', procesos=None, cache=True):
+    estimador = estimador if estimador is not None else lm.LinearRegression()
+    columnas = list(X.columns) if isinstance(X, pd.DataFrame) else list(range(np.shape(X)[1]))
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    particiones = list(_particiones(esquema, pliegues).split(X))
+
+    firma = _firma_configuracion(estimador, X, y, columnas, esquema, pliegues)
+    rutas = [os.path.join(DIRECTORIO_EVALUACION, f'{firma}_{i}.json') for i in range(len(particiones))]
+    resultados = [_leer_cache(r) if cache else None for r in rutas]
+
+    # Solo se ajustan los pliegues que no están en caché, en paralelo si hay más de uno
+    pendientes = [i for i, r in enumerate(resultados) if r is None]
+    if len(pendientes) > 1 and procesos != 1:
+        with ProcessPoolExecutor(max_workers=procesos) as ejecutor:
+            futuros = {i: ejecutor.submit(_evaluar_pliegue, estimador, X, y, *particiones[i]) for i in pendientes}
+            for i, futuro in futuros.items():
+                resultados[i] = futuro.result()
+    else:
+        for i in pendientes:
+            resultados[i] = _evaluar_pliegue(estimador, X, y, *particiones[i])
+
+    if cache:
+        for i in pendientes:
+            _guardar_cache(rutas[i], resultados[i])
+
+    tabla = pd.DataFrame(resultados, columns=METRICAS)
+    tabla.index.name = 'pliegue'
+    return tabla
+
+def comparar_conjuntos(data, conjuntos, estimador=None, pliegues=5, esquema='kfold', procesos=None, cache=True):
+    # Promedio de cada métrica para varios conjuntos candidatos de variables
+    y = data[Modelo.VARIABLE_OBJETIVO]
+    filas = {nombre: validacion_cruzada(data[columnas], y, estimador, pliegues, esquema, procesos, cache).mean()
+             for nombre, columnas in conjuntos.items()}
+    return pd.DataFrame(filas).T
+
+if __name__ == '__main__':
+    data = Modelo.cargar_datos(Modelo.RUTA_DATOS)
+    todas = [c for c in data.columns if c != Modelo.VARIABLE_OBJETIVO]
+    conjuntos = {
+        'Todas las variables': todas,
+        'Sin Visibility (10m)': [c for c in todas if c not in Modelo.VARIABLES_EXCLUIDAS],
+        'Sin variables con VIF > 10': [c for c in todas if c not in Modelo.VARIABLES_EXCLUIDAS
+                                       + ['Temperature(C)', 'Humidity(%)', 'Dew point temperature(C)']],
+    }
+    print(comparar_conjuntos(data, conjuntos))
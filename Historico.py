@@ -0,0 +1,130 @@
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+
+VARIABLE_DEMANDA = 'Rented Bike Count'
+CLAVES = ['Seasons', 'Hour']
+ESTADISTICOS = ['count', 'mean', 'median', 'p10', 'p25', 'p75', 'p90', 'min', 'max']
+
+# Forma de dibujar la demanda histórica según las filas de la estación consultada:
+# hasta LIMITE_CRUDO se envían todos los puntos (WebGL), hasta LIMITE_MUESTREO una muestra de
+# PRESUPUESTO_PUNTOS puntos que conserva la distribución de cada hora y por encima solo los cuantiles del cubo.
+# HISTORICO_MODO fuerza un modo concreto
+LIMITE_CRUDO = int(os.environ.get('HISTORICO_LIMITE_CRUDO', 5000))
+LIMITE_MUESTREO = int(os.environ.get('HISTORICO_LIMITE_MUESTREO', 50000))
+PRESUPUESTO_PUNTOS = int(os.environ.get('HISTORICO_PUNTOS', 5000))
+MODOS = ['crudo', 'muestreo', 'cuantiles']
+MODO = os.environ.get('HISTORICO_MODO')
+
+# Dónde vive el histórico: 'memoria' (este cubo) o 'sqlite' (Almacen.AlmacenHistorico, con filtros por fecha y feriado)
+BACKEND = os.environ.get('HISTORICO_BACKEND', 'memoria')
+
+# Distribuciones valor -> frecuencia (valores ordenados y sin repetir, y sus frecuencias acumuladas): el tamaño
+# depende del rango de la demanda y no del número de filas. Las usan este cubo y Almacen.AlmacenHistorico
+def cuantil(valores, acumulado, q):
+    # Mismo resultado que np.percentile (interpolación lineal) sobre las filas expandidas
+    posicion = q * (acumulado[-1] - 1)
+    inferior, superior = int(np.floor(posicion)), int(np.ceil(posicion))
+    a = float(valores[np.searchsorted(acumulado, inferior, side='right')])
+    b = float(valores[np.searchsorted(acumulado, superior, side='right')])
+    return a + (b - a) * (posicion - inferior)
+
+def estadisticos(valores, acumulado):
+    total = int(acumulado[-1])
+    frecuencias = np.diff(acumulado, prepend=0)
+    media = float(valores.astype(np.float64) @ frecuencias / total)
+    p10, p25, mediana, p75, p90 = (cuantil(valores, acumulado, q) for q in [0.1, 0.25, 0.5, 0.75, 0.9])
+    return [total, media, mediana, p10, p25, p75, p90, float(valores[0]), float(valores[-1])]
+
+def muestra(valores, acumulado, k):
+    # k valores tomados a rangos equiespaciados de las filas expandidas: conserva los cuantiles
+    rangos = np.linspace(0, acumulado[-1] - 1, k).round()
+    return valores[np.searchsorted(acumulado, rangos, side='right')]
+
+def huella(data, h=None):
+    # Hash de las filas (estación, hora, demanda) que se puede continuar con filas anexadas:
+    # huella(todo) == huella(anexadas, huella(previas))
+    h = h or hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(data[CLAVES + [VARIABLE_DEMANDA]], index=False).to_numpy().tobytes())
+    return h
+
+def modo_render(filas, modo=None):
+    modo = modo or MODO
+    if modo in MODOS:
+        return modo
+    if filas <= LIMITE_CRUDO:
+        return 'crudo'
+    if filas <= LIMITE_MUESTREO:
+        return 'muestreo'
+    return 'cuantiles'
+
+# Cubo de demanda histórica por estación y hora, calculado una vez al iniciar y actualizado con las filas que
+# se anexan después (ver Registro.cubo). Cada consulta devuelve 24 filas en lugar de filtrar el DataFrame completo.
+class CuboDemanda:
+    filtrable = False
+
+    def __init__(self, data):
+        self._grupos = {}
+        self._celdas = {}
+        self._huella = hashlib.sha256()
+        self.version = 0
+        self.actualizar(data)
+
+    @property
+    def contenido(self):
+        # Huella de todas las filas del cubo: igual en cualquier proceso que tenga los mismos datos
+        return self._huella.hexdigest()
+
+    def actualizar(self, nuevos):
+        # Solo se recalculan las celdas (estación, hora) que reciben filas nuevas. Cada celda guarda su
+        # distribución valor -> frecuencia en el tipo compacto de la columna, no las filas
+        huella(nuevos, self._huella)
+        for clave, grupo in nuevos.groupby(CLAVES, observed=True)[VARIABLE_DEMANDA]:
+            valores, frecuencias = np.unique(grupo.to_numpy(), return_counts=True)
+            if clave in self._grupos:
+                previos, acumulado = self._grupos[clave]
+                valores, inverso = np.unique(np.concatenate([previos, valores]), return_inverse=True)
+                frecuencias = np.bincount(inverso, np.concatenate([np.diff(acumulado, prepend=0), frecuencias]),
+                                          len(valores))
+            acumulado = np.cumsum(frecuencias).astype(np.int32)
+            self._grupos[clave] = (valores, acumulado)
+            self._celdas[clave] = estadisticos(valores, acumulado)
+        self.tabla = pd.DataFrame.from_dict(self._celdas, orient='index', columns=ESTADISTICOS).sort_index()
+        self.tabla.index = pd.MultiIndex.from_tuples(self.tabla.index, names=CLAVES)
+        self.version += 1
+        return self
+
+    def reiniciar(self, data):
+        # Los datos se reescribieron (no solo se anexaron): se recalcula todo y se publica de una vez
+        nuevo = CuboDemanda(data)
+        self._grupos, self._celdas, self.tabla, self._huella = nuevo._grupos, nuevo._celdas, nuevo.tabla, nuevo._huella
+        self.version += 1
+        return self
+
+    def consultar(self, season):
+        if season not in self.tabla.index.get_level_values('Seasons'):
+            return self.tabla.iloc[0:0].droplevel('Seasons')
+        return self.tabla.loc[season]
+
+    def estaciones(self):
+        return list(dict.fromkeys(self.tabla.index.get_level_values('Seasons')))
+
+    def filas(self, season):
+        return int(self.consultar(season)['count'].sum())
+
+    def puntos(self, season, presupuesto=None):
+        # (horas, demandas) de la estación. Con presupuesto, cada hora aporta una parte proporcional a sus filas
+        # tomada a rangos equiespaciados de su distribución: la muestra conserva los cuantiles de cada hora
+        total = self.filas(season)
+        horas, demandas = [], []
+        for hora in self.consultar(season).index:
+            valores, acumulado = self._grupos[(season, hora)]
+            n = k = int(acumulado[-1])
+            if presupuesto is not None and total > presupuesto:
+                k = max(1, int(round(presupuesto * n / total)))
+            horas.append(np.full(k, hora))
+            demandas.append(muestra(valores, acumulado, k))
+        if not horas:
+            return np.empty(0), np.empty(0)
+        return np.concatenate(horas), np.concatenate(demandas)
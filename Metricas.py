@@ -0,0 +1,199 @@
+import os
+import time
+import cProfile
+import threading
+import functools
+
+# Límites de los histogramas de duración, en segundos
+LIMITES = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Perfilado opcional: toda petición más lenta que este umbral (ms) deja un volcado de cProfile.
+# Una petición con la cabecera X-Perfil igual a PERFIL_TOKEN se perfila siempre, sin importar su duración;
+# sin PERFIL_TOKEN la cabecera se ignora. Solo se conservan los PERFIL_MAX_ARCHIVOS volcados más recientes.
+UMBRAL_PERFIL_MS = os.environ.get('PERFIL_LENTO_MS')
+TOKEN_PERFIL = os.environ.get('PERFIL_TOKEN')
+MAX_PERFILES = int(os.environ.get('PERFIL_MAX_ARCHIVOS', 50))
+
+AYUDA = {
+    'app_callback_segundos': ('histogram', 'Duración de los callbacks de Dash'),
+    'modelo_llamada_segundos': ('histogram', 'Duración de los puntos de entrada de Modelo'),
+    'http_peticion_segundos': ('histogram', 'Duración de las peticiones HTTP'),
+    'datos_lecturas_csv_total': ('counter', 'Lecturas de CSV como texto'),
+    'modelo_ajustes_total': ('counter', 'Ajustes completos del modelo'),
+    'modelo_actualizaciones_total': ('counter', 'Actualizaciones incrementales del modelo'),
+    'etl_filas_total': ('counter', 'Filas transformadas por el ETL'),
+    'modelo_reentreno_segundos': ('histogram', 'Duración de los reentrenamientos en segundo plano'),
+}
+
+_candado = threading.Lock()
+_histogramas = {}
+_contadores = {}
+_fuentes = {}
+# cProfile admite un solo perfilador activo por proceso (Python 3.12+): se perfila una petición a la vez
+_perfilando = threading.Lock()
+
+class Histograma:
+    def __init__(self):
+        self.cubetas = [0] * len(LIMITES)
+        self.suma = 0.0
+        self.cuenta = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(LIMITES):
+            if valor <= limite:
+                self.cubetas[i] += 1
+        self.suma += valor
+        self.cuenta += 1
+
+def _clave(nombre, etiquetas):
+    return nombre, tuple(sorted(etiquetas.items()))
+
+def observar(nombre, segundos, **etiquetas):
+    clave = _clave(nombre, etiquetas)
+    with _candado:
+        histograma = _histogramas.get(clave)
+        if histograma is None:
+            histograma = _histogramas[clave] = Histograma()
+        histograma.observar(segundos)
+
+def incrementar(nombre, valor=1, **etiquetas):
+    clave = _clave(nombre, etiquetas)
+    with _candado:
+        _contadores[clave] = _contadores.get(clave, 0) + valor
+
+def registrar_fuente(prefijo, funcion):
+    # funcion() devuelve un dict de valores numéricos; se exporta como {prefijo}_{clave}
+    _fuentes[prefijo] = funcion
+
+def instrumentar(nombre, **etiquetas):
+    def decorador(funcion):
+        etiquetas_funcion = etiquetas or {'funcion': funcion.__name__}
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                observar(nombre, time.perf_counter() - inicio, **etiquetas_funcion)
+        return envoltura
+    return decorador
+
+def _etiquetas(etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return ''
+    texto = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pares)
+    return '{' + texto + '}'
+
+def exportar():
+    # Formato de texto de Prometheus
+    lineas = []
+    with _candado:
+        histogramas = sorted((k, (list(h.cubetas), h.suma, h.cuenta)) for k, h in _histogramas.items())
+        contadores = sorted(_contadores.items())
+
+    familias = set()
+    for (nombre, etiquetas), (cubetas, suma, cuenta) in histogramas:
+        if nombre not in familias:
+            familias.add(nombre)
+            tipo, ayuda = AYUDA.get(nombre, ('histogram', nombre))
+            lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} histogram']
+        for limite, valor in zip(LIMITES, cubetas):
+            lineas.append(f'{nombre}_bucket{_etiquetas(etiquetas, [("le", limite)])} {valor}')
+        lineas.append(f'{nombre}_bucket{_etiquetas(etiquetas, [("le", "+Inf")])} {cuenta}')
+        lineas.append(f'{nombre}_sum{_etiquetas(etiquetas)} {suma}')
+        lineas.append(f'{nombre}_count{_etiquetas(etiquetas)} {cuenta}')
+
+    for (nombre, etiquetas), valor in contadores:
+        if nombre not in familias:
+            familias.add(nombre)
+            tipo, ayuda = AYUDA.get(nombre, ('counter', nombre))
+            lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} counter']
+        lineas.append(f'{nombre}{_etiquetas(etiquetas)} {valor}')
+
+    for prefijo, funcion in sorted(_fuentes.items()):
+        for clave, valor in sorted(funcion().items()):
+            if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                nombre = f'{prefijo}_{clave}'
+                tipo = 'counter' if clave in ('aciertos', 'fallos', 'desalojos', 'cargas', 'reentrenos', 'errores') else 'gauge'
+                if tipo == 'counter':
+                    nombre += '_total'
+                lineas += [f'# TYPE {nombre} {tipo}', f'{nombre} {valor}']
+    return '\n'.join(lineas) + '\n'
+
+def instalar(server, directorio_perfiles):
+    from flask import Response, g, request
+
+    @server.route('/metrics')
+    def metricas():
+        return Response(exportar(), mimetype='text/plain; version=0.0.4')
+
+    def perfil_pedido():
+        return TOKEN_PERFIL is not None and request.headers.get('X-Perfil') == TOKEN_PERFIL
+
+    @server.before_request
+    def iniciar_peticion():
+        g.inicio_metricas = time.perf_counter()
+        g.perfil = None
+        if (UMBRAL_PERFIL_MS is not None or perfil_pedido()) and _perfilando.acquire(blocking=False):
+            # Si otra petición ya se está perfilando esta no se perfila, en lugar de fallar
+            perfil = cProfile.Profile()
+            try:
+                perfil.enable()
+            except ValueError:
+                # Otra herramienta de perfilado ya está activa en el proceso
+                _perfilando.release()
+                return
+            g.perfil = perfil
+
+    @server.after_request
+    def terminar_peticion(respuesta):
+        inicio = g.pop('inicio_metricas', None)
+        if inicio is None:
+            return respuesta
+        duracion = time.perf_counter() - inicio
+        ruta_peticion = request.url_rule.rule if request.url_rule else 'desconocida'
+        # Se observa al cerrar la respuesta, para incluir el tiempo de las respuestas en streaming (/api/predict)
+        respuesta.call_on_close(lambda: observar('http_peticion_segundos', time.perf_counter() - inicio,
+                                                 ruta=ruta_peticion))
+
+        perfil = g.get('perfil')
+        if perfil is not None:
+            perfil.disable()
+            umbral = 0.0 if perfil_pedido() else float(UMBRAL_PERFIL_MS)
+            if duracion * 1000 >= umbral:
+                os.makedirs(directorio_perfiles, exist_ok=True)
+                nombre = request.path.strip('/').replace('/', '_') or 'raiz'
+                ruta = os.path.join(directorio_perfiles, f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{nombre}.prof')
+                perfil.dump_stats(ruta)
+                rotar_perfiles(directorio_perfiles)
+                respuesta.headers['X-Perfil-Archivo'] = os.path.basename(ruta)
+        return respuesta
+
+    @server.teardown_request
+    def liberar_perfil(error=None):
+        # Se ejecuta también cuando la petición falla, así el perfilador nunca queda tomado
+        perfil = g.pop('perfil', None)
+        if perfil is not None:
+            perfil.disable()
+            _perfilando.release()
+
+def rotar_perfiles(directorio, maximo=None):
+    # Borra los volcados más antiguos para que el directorio no crezca sin límite
+    maximo = MAX_PERFILES if maximo is None else maximo
+    archivos = []
+    for nombre in os.listdir(directorio):
+        if nombre.endswith('.prof'):
+            ruta = os.path.join(directorio, nombre)
+            try:
+                archivos.append((os.path.getmtime(ruta), ruta))
+            except FileNotFoundError:
+                # Otro worker lo borró entre listdir y stat
+                pass
+    archivos.sort()
+    for _, ruta in archivos[:max(len(archivos) - maximo, 0)]:
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
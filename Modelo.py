@@ -1,23 +1,340 @@
+import os
+import time
+import threading
+import functools
 import pandas as pd
 import numpy as np
 import sklearn.linear_model as lm
 from sklearn.model_selection import train_test_split
 import statsmodels.api as sm
 from scipy import stats
+import Datos
+import Metricas
+
+RUTA_DATOS = Datos.RUTA_LIMPIOS
+RUTA_ARTEFACTO = os.path.join(Datos.DIRECTORIO_CACHE, 'modeloRLS.npz')
+
+VARIABLE_OBJETIVO = 'Rented Bike Count'
+VARIABLES_EXCLUIDAS = ['Visibility (10m)']
+
+# Nivel de confianza por defecto del intervalo de predicción (equivale al antiguo ±1.44·sigma)
+NIVEL_CONFIANZA = 0.85
+
+# Cambia cuando el artefacto gana o pierde campos; un artefacto de otra versión se reentrena
+VERSION_ARTEFACTO = 2
+
+# Buffers por hilo para la predicción de un único escenario
+_buffers = threading.local()
+
+# Artefactos ya cargados en memoria, indexados por la ruta del artefacto
+_artefactos = {}
+_candado = threading.Lock()
+
+# Datos y filtro de cada artefacto servido, y número de publicación y hora del último intercambio
+_origenes = {}
+_publicaciones = {}
+
+# Con el reentrenamiento en segundo plano activo (ver Reentrenamiento.py) un artefacto desactualizado se
+# sigue sirviendo y solo se avisa al servicio: ninguna petición espera un ajuste, salvo en el arranque en frío
+_aviso = None
 
 def cargar_datos(datos):
-    return pd.read_csv(datos)
+    return Datos.cargar(datos)
 
-def modeloRLS():
-    data = cargar_datos('SeoulBikeDataClean.csv')
-    X_new = data.drop(['Rented Bike Count','Visibility (10m)'] , axis=1)
-    Y_new = data['Rented Bike Count']
-    
-    X_train, X_test, Y_train, Y_test = train_test_split(X_new, Y_new, test_size=0.2, random_state=0)
+def particion(ruta_datos=RUTA_DATOS, filtro=None):
+    # Variables, objetivo y la partición entrenamiento/prueba que comparten todos los ajustes
+    data = cargar_datos(ruta_datos)
+    X_new = data.drop([VARIABLE_OBJETIVO] + VARIABLES_EXCLUIDAS, axis=1)
+    if filtro:
+        # Modelo de un segmento (p. ej. una estación): solo sus filas y sin las columnas que quedan constantes,
+        # que serían colineales con el intercepto
+        mascara = np.logical_and.reduce([X_new[c].to_numpy() == v for c, v in filtro.items()])
+        data, X_new = data[mascara], X_new[mascara]
+        X_new = X_new.loc[:, X_new.nunique() > 1]
+    Y_new = data[VARIABLE_OBJETIVO]
+    return X_new, Y_new, train_test_split(X_new, Y_new, test_size=0.2, random_state=0)
+
+@Metricas.instrumentar('modelo_llamada_segundos')
+def entrenar(ruta_datos=RUTA_DATOS, filtro=None):
+    Metricas.incrementar('modelo_ajustes_total')
+    X_new, Y_new, (X_train, X_test, Y_train, Y_test) = particion(ruta_datos, filtro)
     modelo = lm.LinearRegression()
     modelo.fit(X_train, Y_train)
 
     residuals = Y_test - modelo.predict(X_test)
     sigma = np.std(residuals)
 
-    return  modelo, sigma
\ No newline at end of file
+    # (X'X)^-1 con la columna de intercepto primero y varianza residual de entrenamiento,
+    # necesarias para el intervalo de predicción exacto de cada escenario
+    Xa = np.column_stack([np.ones(len(X_train)), X_train.to_numpy(dtype=np.float64)])
+    gl = Xa.shape[0] - Xa.shape[1]
+    residuos_train = Y_train.to_numpy(dtype=np.float64) - modelo.predict(X_train)
+
+    return {
+        'version': VERSION_ARTEFACTO,
+        'coef': np.asarray(modelo.coef_, dtype=np.float64),
+        'intercept': float(modelo.intercept_),
+        'sigma': float(sigma),
+        'columnas': np.asarray(X_new.columns, dtype=str),
+        'hash': Datos.hash_archivo(ruta_datos),
+        'firma': Datos.firma_archivo(ruta_datos),
+        'xtx_inv': np.linalg.inv(Xa.T @ Xa),
+        's2': float(residuos_train @ residuos_train / gl),
+        'gl': float(gl),
+    }
+
+def guardar_artefacto(artefacto, ruta=RUTA_ARTEFACTO):
+    with Datos.escritura_atomica(ruta, 'wb') as f:
+        np.savez(f, **{k: np.asarray(v) for k, v in artefacto.items()})
+
+def cargar_artefacto(ruta=RUTA_ARTEFACTO):
+    with np.load(ruta, allow_pickle=False) as npz:
+        artefacto = {k: npz[k] for k in npz.files}
+    if 'version' not in artefacto or int(artefacto['version']) != VERSION_ARTEFACTO:
+        return None
+    artefacto['version'] = int(artefacto['version'])
+    artefacto['s2'] = float(artefacto['s2'])
+    artefacto['gl'] = float(artefacto['gl'])
+    artefacto['intercept'] = float(artefacto['intercept'])
+    artefacto['sigma'] = float(artefacto['sigma'])
+    artefacto['hash'] = str(artefacto['hash'])
+    artefacto['firma'] = tuple(int(v) for v in artefacto['firma'])
+    return artefacto
+
+def _resolver(ruta_datos, ruta_artefacto, filtro, forzar=False):
+    # Artefacto vigente para los datos actuales (ver Datos.resolver_derivado)
+    return Datos.resolver_derivado(ruta_artefacto, ruta_datos, cargar_artefacto, lambda: entrenar(ruta_datos, filtro),
+                                   guardar_artefacto, forzar)
+
+def _publicar(ruta_artefacto, artefacto, reiniciar_motor=True):
+    # Una sola asignación: cada petición ve el artefacto anterior completo o el nuevo completo
+    if reiniciar_motor:
+        _motores.pop(ruta_artefacto, None)
+    _artefactos[ruta_artefacto] = artefacto
+    version = _publicaciones.get(ruta_artefacto, (0, None))[0] + 1
+    _publicaciones[ruta_artefacto] = (version, time.time())
+
+def obtener_modelo(ruta_datos=RUTA_DATOS, ruta_artefacto=RUTA_ARTEFACTO, filtro=None):
+    firma = Datos.firma_archivo(ruta_datos)
+    artefacto = _artefactos.get(ruta_artefacto)
+    if artefacto is not None and artefacto['firma'] == firma:
+        return artefacto
+    if artefacto is not None and _aviso is not None:
+        _aviso(ruta_artefacto)
+        return artefacto
+
+    with _candado:
+        artefacto = _artefactos.get(ruta_artefacto)
+        if artefacto is not None and artefacto['firma'] == firma:
+            return artefacto
+
+        _origenes[ruta_artefacto] = (ruta_datos, filtro)
+        artefacto = _resolver(ruta_datos, ruta_artefacto, filtro)
+        _publicar(ruta_artefacto, artefacto)
+        return artefacto
+
+def reentrenar(ruta_artefacto=RUTA_ARTEFACTO, forzar=False):
+    # Ajuste fuera del candado de servicio: las peticiones siguen usando el artefacto publicado hasta el intercambio.
+    # Devuelve el artefacto nuevo, o None si los datos no cambiaron
+    ruta_datos, filtro = _origenes.get(ruta_artefacto, (RUTA_DATOS, None))
+    actual = _artefactos.get(ruta_artefacto)
+    if not forzar and actual is not None and actual['firma'] == Datos.firma_archivo(ruta_datos):
+        return None
+
+    artefacto = _resolver(ruta_datos, ruta_artefacto, filtro, forzar)
+    with _candado:
+        if actual is not None and not forzar and artefacto['hash'] == actual['hash']:
+            # Solo cambió la firma: se conserva el mismo objeto para no invalidar las cachés derivadas
+            actual['firma'] = artefacto['firma']
+            return None
+        _origenes[ruta_artefacto] = (ruta_datos, filtro)
+        _publicar(ruta_artefacto, artefacto)
+    return artefacto
+
+def version_publicada(ruta_artefacto=RUTA_ARTEFACTO):
+    # (número de publicación, hora del último intercambio) del artefacto servido en este proceso
+    return _publicaciones.get(ruta_artefacto, (0, None))
+
+def servidos():
+    return {ruta: _origenes[ruta] for ruta in list(_artefactos) if ruta in _origenes}
+
+def descartar(ruta_artefacto):
+    # Libera el artefacto (y su motor incremental) de memoria; el archivo sigue en disco para la próxima carga
+    with _candado:
+        _motores.pop(ruta_artefacto, None)
+        _origenes.pop(ruta_artefacto, None)
+        return _artefactos.pop(ruta_artefacto, None)
+
+@Metricas.instrumentar('modelo_llamada_segundos')
+def modeloRLS():
+    artefacto = obtener_modelo()
+    modelo = lm.LinearRegression()
+    modelo.coef_ = artefacto['coef']
+    modelo.intercept_ = artefacto['intercept']
+    modelo.feature_names_in_ = artefacto['columnas'].astype(object)
+    modelo.n_features_in_ = len(artefacto['coef'])
+
+    return  modelo, artefacto['sigma']
+
+def matriz_escenarios(X, columnas):
+    # Acepta DataFrame (se reordena por nombre de columna) o arreglo 1-D/2-D en el orden del modelo
+    if isinstance(X, pd.DataFrame):
+        X = X[list(columnas)].to_numpy(dtype=np.float64)
+    X = np.asarray(X, dtype=np.float64)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    if X.ndim != 2 or X.shape[1] != len(columnas):
+        raise ValueError(f'Se esperaban {len(columnas)} variables por escenario, se recibió la forma {X.shape}')
+    return X
+
+@functools.lru_cache(maxsize=64)
+def valor_t(nivel, gl):
+    return float(stats.t.ppf((1 + nivel) / 2, gl))
+
+def error_estandar(X, artefacto):
+    # Sobre una matriz ya codificada; artefacto solo necesita xtx_inv y s2.
+    # se = sqrt(s²·(1 + x0'(X'X)^-1 x0)) con x0 = [1, x]; se expande por bloques para no copiar X
+    V = artefacto['xtx_inv']
+    h = V[0, 0] + 2 * (X @ V[1:, 0]) + np.einsum('ij,ij->i', X @ V[1:, 1:], X)
+    return np.sqrt(artefacto['s2'] * (1 + h))
+
+@Metricas.instrumentar('modelo_llamada_segundos')
+def error_prediccion(X, artefacto=None):
+    artefacto = artefacto or obtener_modelo()
+    return error_estandar(matriz_escenarios(X, artefacto['columnas']), artefacto)
+
+@Metricas.instrumentar('modelo_llamada_segundos')
+def predict_batch(X, nivel=NIVEL_CONFIANZA, artefacto=None):
+    artefacto = artefacto or obtener_modelo()
+    X = matriz_escenarios(X, artefacto['columnas'])
+
+    media = X @ artefacto['coef'] + artefacto['intercept']
+    margen = valor_t(nivel, artefacto['gl']) * error_estandar(X, artefacto)
+
+    return media, media - margen, media + margen
+
+@Metricas.instrumentar('modelo_llamada_segundos')
+def predict_one(x, nivel=NIVEL_CONFIANZA, artefacto=None):
+    artefacto = artefacto or obtener_modelo()
+    coef = artefacto['coef']
+
+    fila = getattr(_buffers, 'fila', None)
+    if fila is None or fila.shape[0] != coef.shape[0]:
+        fila = np.empty(coef.shape[0], dtype=np.float64)
+        _buffers.fila = fila
+    fila[:] = x
+
+    V = artefacto['xtx_inv']
+    media = float(fila @ coef) + artefacto['intercept']
+    h = V[0, 0] + 2 * float(fila @ V[1:, 0]) + float(fila @ V[1:, 1:] @ fila)
+    margen = valor_t(nivel, artefacto['gl']) * float(np.sqrt(artefacto['s2'] * (1 + h)))
+
+    return media, media - margen, media + margen
+
+# Regresión lineal actualizable con estadísticos suficientes (X'X, X'y, y'y, n).
+# La inversa (X'X)^-1 se mantiene con Sherman-Morrison, de modo que agregar una fila cuesta O(p²).
+# Con olvido < 1 las observaciones antiguas pierden peso de forma exponencial.
+class OLSIncremental:
+    # Cada cuántas actualizaciones fila a fila se recalcula la inversa desde X'X para evitar deriva numérica
+    RECALCULO = 1000
+
+    def __init__(self, columnas, olvido=1.0):
+        if not 0 < olvido <= 1:
+            raise ValueError('El factor de olvido debe estar en (0, 1]')
+        self.columnas = np.asarray(columnas, dtype=str)
+        self.olvido = olvido
+        p = len(self.columnas) + 1
+        self.XtX = np.zeros((p, p))
+        self.Xty = np.zeros(p)
+        self.yty = 0.0
+        self.n = 0.0
+        self.P = None
+        self.beta = np.zeros(p)
+        self._pendientes = 0
+
+    def actualizar(self, X, y):
+        X = matriz_escenarios(X, self.columnas)
+        y = np.asarray(y, dtype=np.float64).ravel()
+        if X.shape[0] != y.shape[0]:
+            raise ValueError('X y y deben tener el mismo número de filas')
+        k = X.shape[0]
+        if k == 0:
+            return self
+        Xa = np.empty((k, X.shape[1] + 1))
+        Xa[:, 0] = 1.0
+        Xa[:, 1:] = X
+
+        # Pesos de olvido dentro del lote: la última fila pesa 1, la anterior olvido, etc.
+        pesos = self.olvido ** np.arange(k - 1, -1, -1, dtype=np.float64)
+        decaimiento = self.olvido ** k
+        self.XtX = decaimiento * self.XtX + (Xa * pesos[:, None]).T @ Xa
+        self.Xty = decaimiento * self.Xty + Xa.T @ (pesos * y)
+        self.yty = decaimiento * self.yty + pesos @ (y * y)
+        self.n = decaimiento * self.n + pesos.sum()
+
+        if self.P is not None and k < Xa.shape[1] and self._pendientes + k < self.RECALCULO:
+            for fila in Xa:
+                Q = self.P / self.olvido
+                Qx = Q @ fila
+                self.P = Q - np.outer(Qx, Qx) / (1.0 + fila @ Qx)
+            self._pendientes += k
+        else:
+            self._recalcular()
+
+        if self.P is not None:
+            self.beta = self.P @ self.Xty
+        return self
+
+    def _recalcular(self):
+        self._pendientes = 0
+        if np.linalg.matrix_rank(self.XtX) < self.XtX.shape[0]:
+            # Aún no hay suficientes observaciones independientes: solución de norma mínima
+            self.P = None
+            self.beta = np.linalg.lstsq(self.XtX, self.Xty, rcond=None)[0]
+        else:
+            self.P = np.linalg.inv(self.XtX)
+
+    @property
+    def intercept(self):
+        return float(self.beta[0])
+
+    @property
+    def coef(self):
+        return self.beta[1:].copy()
+
+    @property
+    def sigma(self):
+        # Varianza residual a partir de los estadísticos: SSE = y'y - b'X'y
+        sse = max(self.yty - self.beta @ self.Xty, 0.0)
+        grados = max(self.n - len(self.beta), 1.0)
+        return float(np.sqrt(sse / grados))
+
+# Motores incrementales por artefacto servido
+_motores = {}
+
+@Metricas.instrumentar('modelo_llamada_segundos')
+def actualizar_modelo(nuevos, ruta_datos=RUTA_DATOS, ruta_artefacto=RUTA_ARTEFACTO, olvido=1.0, filtro=None):
+    # Incorpora nuevas observaciones horarias (DataFrame con la variable objetivo) sin reajustar todo el histórico.
+    # El artefacto se resuelve antes de tomar el candado: obtener_modelo también lo toma en un arranque en frío
+    anterior = obtener_modelo(ruta_datos, ruta_artefacto, filtro)
+    with _candado:
+        # Mismos datos y filtro que el artefacto servido, para que un segmento no reciba el modelo de toda la ciudad
+        ruta_datos, filtro = _origenes.get(ruta_artefacto, (ruta_datos, filtro))
+        motor = _motores.get(ruta_artefacto)
+        if motor is None or motor.olvido != olvido:
+            # El motor arranca con las mismas filas de entrenamiento que el artefacto servido
+            X_new, Y_new, (X_train, X_test, Y_train, Y_test) = particion(ruta_datos, filtro)
+            motor = OLSIncremental(X_new.columns, olvido=olvido).actualizar(X_train, Y_train)
+            _motores[ruta_artefacto] = motor
+
+        motor.actualizar(nuevos, nuevos[VARIABLE_OBJETIVO])
+        Metricas.incrementar('modelo_actualizaciones_total')
+
+        anterior = _artefactos.get(ruta_artefacto) or anterior
+        xtx_inv = motor.P if motor.P is not None else np.linalg.pinv(motor.XtX)
+        artefacto = dict(anterior, coef=motor.coef, intercept=motor.intercept, sigma=motor.sigma,
+                         columnas=motor.columnas, xtx_inv=xtx_inv, s2=motor.sigma ** 2,
+                         gl=max(motor.n - len(motor.beta), 1.0))
+        guardar_artefacto(artefacto, ruta_artefacto)
+        _publicar(ruta_artefacto, artefacto, reiniciar_motor=False)
+        return artefacto
@@ -0,0 +1,61 @@
+import io
+import sys
+import numpy as np
+import pandas as pd
+import Api
+import Datos
+import Registro
+import Variables
+
+# Horizonte aceptado: de un día a una semana de pronóstico horario
+HORAS_MINIMAS = 24
+HORAS_MAXIMAS = 168
+
+# El pronóstico puede traer los nombres de los controles (hour, temperature, ...) o los del CSV original
+RENOMBRAR = {**Variables.CAMPOS, **Variables.BANDERAS, 'Seasons': 'season', 'Date': 'date'}
+
+def leer_pronostico(origen):
+    # origen: ruta, objeto tipo archivo o bytes de un CSV con una fila por hora
+    if isinstance(origen, bytes):
+        origen = io.BytesIO(origen)
+    pronostico = pd.read_csv(origen).rename(columns=RENOMBRAR)
+    if not HORAS_MINIMAS <= len(pronostico) <= HORAS_MAXIMAS:
+        raise ValueError(f'El pronóstico debe tener entre {HORAS_MINIMAS} y {HORAS_MAXIMAS} filas horarias, '
+                         f'tiene {len(pronostico)}')
+    faltantes = [c for c in Variables.CAMPOS.values() if c not in pronostico]
+    if faltantes:
+        raise ValueError(f'Faltan los campos: {faltantes}')
+    return pronostico
+
+def momentos(pronostico):
+    # Eje de tiempo: fecha + hora si el pronóstico trae fecha, si no las horas del horizonte
+    if 'date' not in pronostico:
+        return pd.Series(np.arange(len(pronostico)), index=pronostico.index)
+    # Los pronósticos suelen traer fechas ISO (2018-12-01); el día primero (01/12/2018) es solo la forma del dataset
+    try:
+        fechas = pd.to_datetime(pronostico['date'], format='ISO8601')
+    except (ValueError, TypeError):
+        try:
+            fechas = pd.to_datetime(pronostico['date'], dayfirst=True)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f'Fechas del pronóstico no válidas: {e}')
+    return fechas + pd.to_timedelta(pronostico['hour'], unit='h')
+
+def pronosticar(pronostico, costos=None, ciudad=Registro.CIUDAD_POR_DEFECTO):
+    # Todo el horizonte se puntúa en una sola llamada vectorizada, con intervalo y, si hay costos, precio por hora
+    escenarios = pronostico.assign(city=ciudad)
+    resultado = Api.puntuar(escenarios, costos)
+    resultado.insert(0, 'time', momentos(pronostico).to_numpy())
+    return resultado
+
+def ejemplo(horas=HORAS_MAXIMAS, ruta=Datos.RUTA_ORIGINALES):
+    # Pronóstico de muestra: las últimas horas de los datos originales sin la variable objetivo
+    originales = Datos.leer_csv(ruta)
+    return originales.tail(horas).drop(columns=['Rented Bike Count']).reset_index(drop=True)
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        pronostico = leer_pronostico(sys.argv[1])
+    else:
+        pronostico = ejemplo().rename(columns=RENOMBRAR)
+    print(pronosticar(pronostico).to_string(index=False))
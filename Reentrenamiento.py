@@ -0,0 +1,140 @@
+import os
+import time
+import threading
+import Estimadores
+import Metricas
+import Modelo
+import Registro
+
+# Cada cuántos segundos se revisan los archivos de datos de los modelos servidos (0: solo con disparo explícito)
+INTERVALO = float(os.environ.get('REENTRENO_SEGUNDOS', 30))
+
+# Reentrenamiento en segundo plano: un hilo vigila la firma de los datos de cada artefacto servido (o recibe un
+# disparo explícito), ajusta fuera del camino de las peticiones y publica el artefacto nuevo con un intercambio
+# atómico. Mientras tanto las peticiones siguen respondiendo con el artefacto anterior.
+#
+# Con gunicorn el hilo se arranca en cada worker después del fork (ver gunicorn.conf.py); el bloqueo de archivo
+# de Modelo hace que solo un worker ajuste y el resto cargue el artefacto que dejó en disco.
+class ServicioReentrenamiento:
+    def __init__(self, intervalo=INTERVALO):
+        self.intervalo = intervalo
+        self._evento = threading.Event()
+        self._candado = threading.Lock()
+        self._pendientes = set()
+        self._forzados = set()
+        self._hilo = None
+        self._detenido = False
+        self.reentrenos = 0
+        self.errores = 0
+        self.duracion = 0.0
+        self.en_curso = False
+
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def iniciar(self):
+        if not self.activo():
+            self._detenido = False
+            self._hilo = threading.Thread(target=self._ciclo, name='reentrenamiento', daemon=True)
+            self._hilo.start()
+            Modelo._aviso = self.avisar
+        return self
+
+    def detener(self):
+        Modelo._aviso = None
+        self._detenido = True
+        self._evento.set()
+        if self._hilo is not None:
+            self._hilo.join()
+
+    def avisar(self, ruta_artefacto):
+        # Se llama desde el camino de las peticiones: solo encola y despierta al hilo
+        with self._candado:
+            self._pendientes.add(ruta_artefacto)
+        self._evento.set()
+
+    def disparar(self, ruta_artefacto=None, forzar=False):
+        rutas = [ruta_artefacto] if ruta_artefacto else list(Modelo.servidos())
+        with self._candado:
+            self._pendientes.update(rutas)
+            if forzar:
+                self._forzados.update(rutas)
+        self.iniciar()
+        self._evento.set()
+
+    def _ciclo(self):
+        while not self._detenido:
+            self._evento.wait(self.intervalo if self.intervalo > 0 else None)
+            self._evento.clear()
+            if self._detenido:
+                break
+            with self._candado:
+                pendientes, forzados = self._pendientes, self._forzados
+                self._pendientes, self._forzados = set(), set()
+            if self.intervalo > 0:
+                pendientes |= set(Modelo.servidos())
+            for ruta in pendientes:
+                self._reentrenar(ruta, ruta in forzados)
+            self._reentrenar_estimadores(bool(forzados))
+
+    def _reentrenar(self, ruta_artefacto, forzar):
+        inicio = time.perf_counter()
+        self.en_curso = True
+        try:
+            artefacto = Modelo.reentrenar(ruta_artefacto, forzar)
+        except Exception as e:
+            # Un ajuste fallido (p. ej. un archivo a medio escribir) no detiene el servicio: se sigue sirviendo
+            # el artefacto anterior y se reintenta en la siguiente revisión
+            self.errores += 1
+            print(f'Error al reentrenar {ruta_artefacto}: {e}')
+            return
+        finally:
+            self.en_curso = False
+        if artefacto is None:
+            return
+
+        self.duracion = time.perf_counter() - inicio
+        self.reentrenos += 1
+        Metricas.observar('modelo_reentreno_segundos', self.duracion)
+        # Las cachés derivadas se indexan por la identidad del artefacto: se reconstruyen aquí para que la
+        # primera petición después del intercambio no pague su costo
+        Modelo.valor_t(Modelo.NIVEL_CONFIANZA, artefacto['gl'])
+        Registro.obtener_registro().calentar(ruta_artefacto)
+
+    def _reentrenar_estimadores(self, forzar):
+        # Los backends de Estimadores se mantienen al día igual que el artefacto OLS: fuera de las peticiones y
+        # con un intercambio atómico
+        inicio = time.perf_counter()
+        try:
+            reajustados = Estimadores.reentrenar(forzar)
+        except Exception as e:
+            self.errores += 1
+            print(f'Error al reentrenar los estimadores: {e}')
+            return
+        if reajustados:
+            self.reentrenos += len(reajustados)
+            Metricas.observar('modelo_reentreno_segundos', time.perf_counter() - inicio)
+
+    def estado(self, ruta_artefacto=Modelo.RUTA_ARTEFACTO):
+        version, intercambio = Modelo.version_publicada(ruta_artefacto)
+        artefacto = Modelo._artefactos.get(ruta_artefacto)
+        return {'version': version, 'hash': artefacto['hash'] if artefacto else None, 'ultimo_intercambio': intercambio,
+                'duracion_segundos': self.duracion, 'en_curso': self.en_curso, 'activo': self.activo()}
+
+    def estadisticas(self):
+        version, intercambio = Modelo.version_publicada()
+        return {'reentrenos': self.reentrenos, 'errores': self.errores, 'duracion_segundos': self.duracion,
+                'en_curso': int(self.en_curso), 'version_modelo': version,
+                'ultimo_intercambio': intercambio or 0.0}
+
+_servicio = None
+_candado = threading.Lock()
+
+def obtener_servicio():
+    global _servicio
+    if _servicio is None:
+        with _candado:
+            if _servicio is None:
+                _servicio = ServicioReentrenamiento()
+                Metricas.registrar_fuente('reentrenamiento', _servicio.estadisticas)
+    return _servicio
@@ -0,0 +1,248 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import Almacen
+import Datos
+import Historico
+import Metricas
+import Modelo
+import Rejilla
+import Variables
+
+# Ciudades servidas: JSON {"ciudad": {"limpios": ruta, "originales": ruta}} en la ruta de CIUDADES.
+# Sin configuración se sirve solo Seúl con las rutas de Datos.py
+RUTA_CIUDADES = os.environ.get('CIUDADES')
+CIUDAD_POR_DEFECTO = 'Seoul'
+
+# Segmentos: filas de los datos limpios con las que se ajusta cada modelo (None es el modelo de toda la ciudad)
+SEGMENTOS = {
+    None: None,
+    'Spring': {'Seasons_Spring': 1},
+    'Summer': {'Seasons_Summer': 1},
+    'Winter': {'Seasons_Winter': 1},
+    'Autumn': {'Seasons_Spring': 0, 'Seasons_Summer': 0, 'Seasons_Winter': 0},
+}
+
+# Memoria máxima de los artefactos cargados antes de desalojar el menos usado recientemente
+PRESUPUESTO_MB = float(os.environ.get('MODELOS_MEMORIA_MB', 64))
+
+def leer_ciudades(ruta=RUTA_CIUDADES):
+    if not ruta:
+        return {CIUDAD_POR_DEFECTO: {'limpios': Datos.RUTA_LIMPIOS, 'originales': Datos.RUTA_ORIGINALES}}
+    with open(ruta) as f:
+        ciudades = json.load(f)
+    base = os.path.dirname(os.path.abspath(ruta))
+    # Rutas relativas al archivo de configuración
+    return {ciudad: {k: os.path.join(base, v) for k, v in rutas.items()} for ciudad, rutas in ciudades.items()}
+
+def tamano(artefacto):
+    return sum(v.nbytes for v in artefacto.values() if isinstance(v, np.ndarray))
+
+# Registro de modelos por (ciudad, segmento). Los artefactos se cargan (o entrenan) en el primer uso y se
+# desalojan por LRU cuando su tamaño total supera el presupuesto; los datos derivados de cada modelo
+# (esquema de variables, tabla de la rejilla) viven y mueren con su entrada.
+class RegistroModelos:
+    def __init__(self, ciudades=None, presupuesto_mb=PRESUPUESTO_MB):
+        self.ciudades = ciudades or leer_ciudades()
+        self.presupuesto = presupuesto_mb * 2 ** 20
+        self._entradas = OrderedDict()
+        self._cubos = {}
+        # Firma y filas de los datos originales con que se construyó cada cubo en memoria
+        self._fuentes_cubos = {}
+        self._recargas = {}
+        self._candado = threading.RLock()
+        self.bytes = 0
+        self.aciertos = 0
+        self.cargas = 0
+        self.desalojos = 0
+
+    def ruta_artefacto(self, ciudad, segmento=None):
+        # El modelo de la ciudad por defecto es el mismo artefacto que sirve Modelo.obtener_modelo()
+        if segmento is None and self.ciudades[ciudad]['limpios'] == Modelo.RUTA_DATOS:
+            return Modelo.RUTA_ARTEFACTO
+        nombre = f'modeloRLS_{ciudad}' + (f'_{segmento}' if segmento else '') + '.npz'
+        return os.path.join(Datos.DIRECTORIO_CACHE, 'modelos', nombre)
+
+    def _validar(self, ciudad, segmento):
+        if ciudad not in self.ciudades:
+            raise ValueError(f'Ciudad desconocida: {ciudad}')
+        if segmento not in SEGMENTOS:
+            raise ValueError(f'Segmento desconocido: {segmento}')
+
+    def entrada(self, ciudad=CIUDAD_POR_DEFECTO, segmento=None):
+        self._validar(ciudad, segmento)
+        clave = (ciudad, segmento)
+        # La firma del archivo de datos se revisa en Modelo.obtener_modelo: si cambió, se vuelve a cargar. La carga
+        # (o el ajuste en frío) ocurre fuera del candado, que solo protege la publicación en el registro
+        artefacto = Modelo.obtener_modelo(self.ciudades[ciudad]['limpios'], self.ruta_artefacto(ciudad, segmento),
+                                          SEGMENTOS[segmento])
+        with self._candado:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada['artefacto'] is artefacto:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return entrada
+
+            if entrada is not None:
+                self.bytes -= entrada['bytes']
+            else:
+                self.cargas += 1
+            entrada = {'artefacto': artefacto, 'esquema': Variables.EsquemaVariables(artefacto['columnas']),
+                       'tabla': None, 'bytes': tamano(artefacto)}
+            self._entradas[clave] = entrada
+            self._entradas.move_to_end(clave)
+            self.bytes += entrada['bytes']
+            self._desalojar()
+            return entrada
+
+    def calentar(self, ruta_artefacto):
+        # Tras un intercambio (ver Reentrenamiento.py) se reconstruyen la entrada y la tabla de la rejilla de cada
+        # clave servida con ese artefacto, para que la primera petición no pague su costo
+        with self._candado:
+            claves = [clave for clave in self._entradas if self.ruta_artefacto(*clave) == ruta_artefacto]
+        for ciudad, segmento in claves:
+            self.tabla(ciudad, segmento)
+
+    def _desalojar(self):
+        # Siempre queda al menos el modelo recién pedido, aunque por sí solo supere el presupuesto
+        while self.bytes > self.presupuesto and len(self._entradas) > 1:
+            (ciudad, segmento), entrada = self._entradas.popitem(last=False)
+            self.bytes -= entrada['bytes']
+            self.desalojos += 1
+            Modelo.descartar(self.ruta_artefacto(ciudad, segmento))
+
+    def modelo(self, ciudad=CIUDAD_POR_DEFECTO, segmento=None):
+        return self.entrada(ciudad, segmento)['artefacto']
+
+    def esquema(self, ciudad=CIUDAD_POR_DEFECTO, segmento=None):
+        return self.entrada(ciudad, segmento)['esquema']
+
+    def tabla(self, ciudad=CIUDAD_POR_DEFECTO, segmento=None):
+        entrada = self.entrada(ciudad, segmento)
+        if entrada['tabla'] is None:
+            entrada['tabla'] = Rejilla.TablaDemanda(entrada['artefacto'])
+        return entrada['tabla']
+
+    def version(self, ciudad=CIUDAD_POR_DEFECTO, segmento=None):
+        # Cambia con cada artefacto publicado: reentrenamiento completo o actualización incremental
+        artefacto = self.modelo(ciudad, segmento)
+        return f"{artefacto['hash'][:16]}:{Modelo.version_publicada(self.ruta_artefacto(ciudad, segmento))[0]}"
+
+    def parametros_cliente(self, ciudad=CIUDAD_POR_DEFECTO, segmento=None, nivel=Modelo.NIVEL_CONFIANZA):
+        # Todo lo que el navegador necesita para predecir por sí mismo (ver assets/prediccion.js)
+        entrada = self.entrada(ciudad, segmento)
+        artefacto, esquema = entrada['artefacto'], entrada['esquema']
+        return {
+            'city': ciudad,
+            'version': self.version(ciudad, segmento),
+            'intercept': artefacto['intercept'],
+            'coef': artefacto['coef'].tolist(),
+            'indices': esquema.indices,
+            'seasons': {e: int(i) for e, i in zip(esquema.estaciones, esquema.indices_estacion)},
+            'xtxInv': artefacto['xtx_inv'].tolist(),
+            's2': artefacto['s2'],
+            't': Modelo.valor_t(nivel, artefacto['gl']),
+            'level': nivel,
+        }
+
+    def _originales(self, ciudad):
+        return Datos.cargar(self.ciudades[ciudad]['originales'], columnas=Datos.COLUMNAS_HISTORICO,
+                            esquema=Datos.ESQUEMA_ORIGINALES)
+
+    def cubo(self, ciudad=CIUDAD_POR_DEFECTO):
+        # Los cubos históricos son pequeños (estación × hora) y no entran en el presupuesto; con el backend
+        # sqlite el histórico queda en disco y solo se consulta por agregados
+        self._validar(ciudad, None)
+        if ciudad not in self._cubos:
+            # Se construye fuera del candado; si dos hilos lo construyen a la vez se publica el primero
+            rutas = self.ciudades[ciudad]
+            if Historico.BACKEND == 'sqlite':
+                ruta_base = os.path.join(Datos.DIRECTORIO_CACHE, f'historico_{ciudad}.sqlite')
+                cubo, fuente = Almacen.AlmacenHistorico(ruta_base, rutas['originales'], rutas['limpios']), None
+            else:
+                firma = Datos.firma_archivo(rutas['originales'])
+                data = self._originales(ciudad)
+                cubo, fuente = Historico.CuboDemanda(data), (firma, len(data))
+            with self._candado:
+                if ciudad not in self._cubos:
+                    self._cubos[ciudad] = cubo
+                    if fuente is not None:
+                        self._fuentes_cubos[ciudad] = fuente
+        self._vigilar_cubo(ciudad)
+        return self._cubos[ciudad]
+
+    def _vigilar_cubo(self, ciudad):
+        # Filas anexadas a los datos originales (p. ej. por el ETL) entran al cubo con CuboDemanda.actualizar;
+        # si el archivo se reescribió, el cubo se recalcula. La comprobación normal es solo un stat
+        if Historico.BACKEND == 'sqlite':
+            # El almacén vigila sus fuentes y reimporta en segundo plano
+            self._cubos[ciudad].vigilar()
+            return
+        fuente = self._fuentes_cubos.get(ciudad)
+        ruta = self.ciudades[ciudad]['originales']
+        if fuente is None or Datos.firma_archivo(ruta) == fuente[0]:
+            return
+        # Un solo hilo recarga cada ciudad, sin tomar el candado del registro; los demás siguen respondiendo con
+        # el cubo actual mientras tanto
+        recarga = self._recargas.setdefault(ciudad, threading.Lock())
+        if not recarga.acquire(blocking=False):
+            return
+        try:
+            firma, filas = self._fuentes_cubos[ciudad]
+            if Datos.firma_archivo(ruta) == firma:
+                return
+            firma = Datos.firma_archivo(ruta)
+            data = self._originales(ciudad)
+            cubo = self._cubos[ciudad]
+            if len(data) >= filas and Historico.huella(data.iloc[:filas]).hexdigest() == cubo.contenido:
+                if len(data) > filas:
+                    cubo.actualizar(data.iloc[filas:])
+            else:
+                cubo.reiniciar(data)
+            with self._candado:
+                self._fuentes_cubos[ciudad] = (firma, len(data))
+        finally:
+            recarga.release()
+
+    def contenido_cubo(self, ciudad=CIUDAD_POR_DEFECTO):
+        # Forma parte de la clave de la caché de figuras, que comparten los workers: depende de los datos del
+        # cubo (se revisan antes de responder con una figura), no de contadores de este proceso
+        return self.cubo(ciudad).contenido
+
+    def predecir(self, escenarios, nivel=Modelo.NIVEL_CONFIANZA):
+        # Lote con columnas opcionales city y segment: se agrupa por modelo y cada grupo se puntúa con una
+        # sola multiplicación de matrices; los resultados vuelven en el orden de entrada
+        if not isinstance(escenarios, pd.DataFrame):
+            escenarios = pd.DataFrame.from_records(escenarios)
+        ciudades = escenarios['city'] if 'city' in escenarios else pd.Series(None, index=escenarios.index)
+        ciudades = ciudades.astype(object).where(ciudades.notna(), CIUDAD_POR_DEFECTO)
+        segmentos = escenarios['segment'] if 'segment' in escenarios else pd.Series(None, index=escenarios.index)
+        segmentos = segmentos.astype(object).where(segmentos.notna(), None)
+
+        media, inf, sup = (np.empty(len(escenarios)) for _ in range(3))
+        grupos = pd.DataFrame({'ciudad': ciudades.to_numpy(), 'segmento': segmentos.to_numpy()})
+        for (ciudad, segmento), filas in grupos.groupby(['ciudad', 'segmento'], dropna=False, sort=False).indices.items():
+            segmento = None if pd.isna(segmento) else segmento
+            entrada = self.entrada(ciudad, segmento)
+            X = entrada['esquema'].matriz(escenarios.iloc[filas])
+            media[filas], inf[filas], sup[filas] = Modelo.predict_batch(X, nivel, entrada['artefacto'])
+        return media, inf, sup
+
+    def estadisticas(self):
+        return {'modelos': len(self._entradas), 'bytes': self.bytes, 'aciertos': self.aciertos,
+                'cargas': self.cargas, 'desalojos': self.desalojos}
+
+_registro = None
+_candado = threading.Lock()
+
+def obtener_registro():
+    global _registro
+    if _registro is None:
+        with _candado:
+            if _registro is None:
+                _registro = RegistroModelos()
+                Metricas.registrar_fuente('registro_modelos', _registro.estadisticas)
+    return _registro
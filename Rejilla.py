@@ -0,0 +1,77 @@
+import threading
+import numpy as np
+import Modelo
+import Variables
+
+# Rango y paso de cada control del tablero
+CONTROLES = {
+    'hour': (0, 23, 1),
+    'temperature': (-20, 50, 1),
+    'humidity': (0, 100, 1),
+    'windSpeed': (0, 8, 0.5),
+    'dewPointTemperature': (-30, 30, 1),
+    'solarRadiation': (0, 4, 0.2),
+    'rainfall': (0, 35, 1),
+    'snowfall': (0, 10, 0.5),
+}
+ESTACIONES = [None, 'Spring', 'Summer', 'Winter']
+
+def valores(nombre):
+    minimo, maximo, paso = CONTROLES[nombre]
+    return np.round(minimo + paso * np.arange(int(round((maximo - minimo) / paso)) + 1), 10)
+
+# Como el modelo es lineal, la demanda sobre la rejilla completa es la suma de una contribución por control.
+# Basta guardar un vector por control (unos cientos de valores) para responder cualquier punto con índices.
+class TablaDemanda:
+    def __init__(self, artefacto):
+        self.artefacto = artefacto
+        esquema = Variables.EsquemaVariables(artefacto['columnas'])
+        # Los modelos por segmento no traen las columnas que eran constantes en sus datos: aportan 0
+        coef = np.append(artefacto['coef'], 0.0)
+        indice = lambda campo: esquema.indices.get(campo, -1)
+        estacion = lambda e: esquema.indices_estacion[esquema.estaciones.index(e)] if e in esquema.estaciones else -1
+        self.base = artefacto['intercept'] + coef[indice('functioningDay')]
+        self.contribuciones = {nombre: coef[indice(nombre)] * valores(nombre) for nombre in CONTROLES}
+        self.contribuciones['holiday'] = np.array([0, coef[indice('holiday')]], dtype=np.float64)
+        self.contribuciones['season'] = np.array([0] + [coef[estacion(e)] for e in ESTACIONES[1:]], dtype=np.float64)
+
+    def indice(self, nombre, valor):
+        if nombre == 'holiday':
+            return int(bool(valor))
+        if nombre == 'season':
+            return ESTACIONES.index(valor) if valor in ESTACIONES else 0
+        minimo, maximo, paso = CONTROLES[nombre]
+        posicion = (valor - minimo) / paso
+        i = int(round(posicion))
+        if abs(posicion - i) > 1e-6 or not 0 <= i < len(self.contribuciones[nombre]):
+            raise ValueError(f'{valor} no es un valor del control {nombre}')
+        return i
+
+    def demanda(self, **escenario):
+        return float(self.base + sum(self.contribuciones[n][self.indice(n, v)] for n, v in escenario.items()))
+
+    def subrejilla(self, ejes, **fijos):
+        # Evalúa en un solo paso vectorizado la rejilla densa sobre los ejes pedidos; el resto queda fijo
+        total = self.base + sum(self.contribuciones[n][self.indice(n, v)] for n, v in fijos.items() if n not in ejes)
+        forma = [len(self.contribuciones[n]) for n in ejes]
+        rejilla = np.full(forma, total, dtype=np.float32)
+        for k, nombre in enumerate(ejes):
+            dimensiones = [1] * len(ejes)
+            dimensiones[k] = forma[k]
+            rejilla += self.contribuciones[nombre].reshape(dimensiones)
+        return rejilla
+
+_tabla = None
+_candado = threading.Lock()
+
+def obtener_tabla():
+    # Se reconstruye solo cuando cambia el artefacto servido
+    global _tabla
+    artefacto = Modelo.obtener_modelo()
+    tabla = _tabla
+    if tabla is None or tabla.artefacto is not artefacto:
+        with _candado:
+            if _tabla is None or _tabla.artefacto is not artefacto:
+                _tabla = TablaDemanda(artefacto)
+            tabla = _tabla
+    return tabla
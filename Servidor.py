@@ -0,0 +1,39 @@
+# Modo de producción con un servidor WSGI pre-fork (gunicorn).
+#
+#   gunicorn Servidor:server
+#
+# gunicorn lee gunicorn.conf.py de este directorio (puerto, workers, hilos y preload_app = True).
+# El proceso maestro importa App una sola vez (preload_app): datos compactos, cubo histórico, artefacto del
+# modelo y tabla de la rejilla quedan construidos antes del fork y los workers los comparten copy-on-write.
+import os
+import gc
+
+# Con varios workers la caché de figuras se comparte en disco salvo que se configure otra cosa
+os.environ.setdefault('CACHE_FIGURAS', 'archivos')
+
+import App
+import Modelo
+import Reentrenamiento
+import Registro
+
+server = App.server
+
+def precargar():
+    # Todo lo que cada worker usaría de forma perezosa se construye aquí, en el maestro
+    # Entrada por defecto del registro (artefacto, esquema y tabla de la rejilla): la que leen el tablero y la API
+    entrada = App.modelRegistry.entrada()
+    App.modelRegistry.tabla()
+    Modelo.valor_t(Modelo.NIVEL_CONFIANZA, entrada['artefacto']['gl'])
+    # Con los mismos argumentos que envía el layout por defecto: la clave de la caché depende de todos ellos
+    App.updateHistoricDemand('Winter', Registro.CIUDAD_POR_DEFECTO, None, None, 'all')
+    # Los objetos que ya existen salen del recolector: así el GC de cada worker no escribe en sus
+    # cabeceras y las páginas compartidas no se copian
+    gc.collect()
+    gc.freeze()
+
+precargar()
+
+if __name__ == '__main__':
+    # Sin gunicorn (por ejemplo en Windows) se sirve con el servidor de Flask sin modo debug
+    Reentrenamiento.obtener_servicio().iniciar()
+    server.run(host='0.0.0.0', port=int(os.environ.get('PUERTO', '8050')), threaded=True)
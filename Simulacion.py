@@ -0,0 +1,61 @@
+import numpy as np
+
+MUESTRAS = 100_000
+PRECIOS = 200
+CUANTILES = [0.1, 0.5, 0.9]
+
+def muestrear_demanda(media, sigma, n=MUESTRAS, semilla=0):
+    # Demanda simulada con la distribución predictiva del modelo, truncada en 0 y ya ordenada
+    rng = np.random.default_rng(semilla)
+    demanda = rng.normal(media, sigma, n)
+    np.maximum(demanda, 0, out=demanda)
+    demanda.sort()
+    return demanda
+
+def probabilidad_cubrir(demanda, fijo, variable, precios, rentabilidad=0.0):
+    # La ganancia (p - v - m)·D - F es creciente en D, así que P(ganancia >= 0) = P(D >= F / (p - v - m)).
+    # Con la muestra ordenada basta un searchsorted por precio, sin materializar la matriz precio x muestra.
+    fijo, variable, precios = np.broadcast_arrays(np.asarray(fijo, dtype=np.float64),
+                                                  np.asarray(variable, dtype=np.float64),
+                                                  np.asarray(precios, dtype=np.float64))
+    margen = precios - variable - rentabilidad
+    # Con margen 0 y costo fijo 0 la división es 0/0; np.where descarta ese valor, igual que los de margen <= 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        umbral = np.where(margen > 0, fijo / margen, np.inf)
+    return 1.0 - np.searchsorted(demanda, umbral, side='left') / len(demanda)
+
+def simular(media, sigma, fijo, variable, rentabilidad=0.0, precios=None, objetivo=0.9, n=MUESTRAS, semilla=0):
+    demanda = muestrear_demanda(media, sigma, n, semilla)
+    cuantiles_demanda = np.quantile(demanda, CUANTILES)
+
+    # Precio mínimo que cubre costos y rentabilidad con probabilidad objetivo: cuantil 1 - objetivo de la demanda
+    demanda_critica = np.quantile(demanda, 1 - objetivo)
+    precio_optimo = variable + rentabilidad + fijo / demanda_critica if demanda_critica > 0 else None
+
+    if precios is None:
+        referencia = precio_optimo if precio_optimo is not None else variable + rentabilidad + fijo
+        # Sin costos ni rentabilidad la referencia es 0: la rejilla llega al menos a una unidad de precio
+        tope = max(2 * referencia, variable + rentabilidad + 1.0)
+        precios = np.linspace(variable + rentabilidad, tope, PRECIOS)[1:]
+    precios = np.asarray(precios, dtype=np.float64)
+
+    # La ganancia es afín en la demanda, por lo que sus cuantiles salen de los de la demanda
+    margen = precios - variable
+    ganancia_media = margen * demanda.mean() - fijo
+    ganancia_cuantiles = margen[:, None] * cuantiles_demanda[None, :] - fijo
+
+    return {
+        'precios': precios,
+        'probabilidad_cubrir': probabilidad_cubrir(demanda, fijo, variable, precios, rentabilidad),
+        'ganancia_media': ganancia_media,
+        'ganancia_cuantiles': ganancia_cuantiles,
+        'precio_optimo': precio_optimo,
+        'objetivo': objetivo,
+        'demanda': demanda,
+    }
+
+def barrido_costos(media, sigma, fijos, variables, precios, rentabilidad=0.0, n=MUESTRAS, semilla=0):
+    # Probabilidad de cubrir costos para cada combinación (costo fijo, costo variable, precio)
+    demanda = muestrear_demanda(media, sigma, n, semilla)
+    return probabilidad_cubrir(demanda, np.asarray(fijos)[:, None, None], np.asarray(variables)[None, :, None],
+                               np.asarray(precios)[None, None, :], rentabilidad)
@@ -0,0 +1,118 @@
+import threading
+import numpy as np
+import pandas as pd
+import Modelo
+
+# Campo de entrada (controles del tablero, API) que alimenta cada columna de entrenamiento
+CAMPOS = {
+    'Hour': 'hour',
+    'Temperature(C)': 'temperature',
+    'Humidity(%)': 'humidity',
+    'Wind speed (m/s)': 'windSpeed',
+    'Dew point temperature(C)': 'dewPointTemperature',
+    'Solar Radiation (MJ/m2)': 'solarRadiation',
+    'Rainfall(mm)': 'rainfall',
+    'Snowfall (cm)': 'snowfall',
+}
+BANDERAS = {'Holiday': 'holiday', 'Functioning Day': 'functioningDay'}
+PREFIJO_ESTACION = 'Seasons_'
+# Valores por defecto de los campos opcionales: el tablero solo predice días con servicio
+POR_DEFECTO = {'holiday': False, 'functioningDay': True, 'season': None}
+VERDADEROS = ['1', 'true', 'yes', 'si', 'sí', 'holiday']
+
+def si_no(serie):
+    serie = pd.Series(serie)
+    if serie.dtype == object or isinstance(serie.dtype, (pd.StringDtype, pd.CategoricalDtype)):
+        return serie.astype(str).str.strip().str.lower().isin(VERDADEROS).to_numpy()
+    return serie.fillna(0).astype(bool).to_numpy()
+
+# Esquema de variables construido a partir de las columnas de entrenamiento: sabe en qué posición va cada
+# campo, de modo que la fila de un escenario y la matriz de un lote se llenan sin listas intermedias
+class EsquemaVariables:
+    def __init__(self, columnas):
+        self.columnas = tuple(str(c) for c in columnas)
+        self.indices = {}
+        self.numericos = []
+        self.banderas = []
+        self.estaciones = []
+        indices_estacion = []
+        for i, columna in enumerate(self.columnas):
+            if columna in CAMPOS:
+                self.numericos.append(CAMPOS[columna])
+                self.indices[CAMPOS[columna]] = i
+            elif columna in BANDERAS:
+                self.banderas.append(BANDERAS[columna])
+                self.indices[BANDERAS[columna]] = i
+            elif columna.startswith(PREFIJO_ESTACION):
+                self.estaciones.append(columna[len(PREFIJO_ESTACION):])
+                indices_estacion.append(i)
+            else:
+                raise ValueError(f'La columna de entrenamiento {columna} no tiene un campo de entrada asociado')
+        self.indices_numericos = np.array([self.indices[c] for c in self.numericos], dtype=np.intp)
+        self.indices_estacion = np.array(indices_estacion, dtype=np.intp)
+        self.estaciones_array = np.array(self.estaciones, dtype=object)
+        self._buffers = threading.local()
+
+    def validar(self, artefacto):
+        columnas = tuple(str(c) for c in artefacto['columnas'])
+        if columnas != self.columnas:
+            raise ValueError(f'El esquema {self.columnas} no coincide con el modelo ajustado {columnas}')
+        return self
+
+    def fila(self, **escenario):
+        # Reutiliza un buffer por hilo; el resultado es válido hasta la siguiente llamada del mismo hilo
+        x = getattr(self._buffers, 'fila', None)
+        if x is None:
+            x = self._buffers.fila = np.empty(len(self.columnas), dtype=np.float64)
+        x[:] = 0
+        for campo in self.numericos:
+            x[self.indices[campo]] = escenario[campo]
+        for campo in self.banderas:
+            x[self.indices[campo]] = bool(escenario.get(campo, POR_DEFECTO[campo]))
+        season = escenario.get('season')
+        if season in self.estaciones:
+            x[self.indices_estacion[self.estaciones.index(season)]] = 1
+        return x
+
+    def desde_controles(self, hour, temperature, humidity, windSpeed, dewPointTemperature, solarRadiation,
+                        rainfall, snowfall, checkBoxDummies, season):
+        return self.fila(hour=hour, temperature=temperature, humidity=humidity, windSpeed=windSpeed,
+                         dewPointTemperature=dewPointTemperature, solarRadiation=solarRadiation, rainfall=rainfall,
+                         snowfall=snowfall, holiday='Holiday' in checkBoxDummies, functioningDay=True, season=season)
+
+    def matriz(self, escenarios, out=None):
+        # Lote de escenarios (DataFrame o lista de dicts) -> matriz del modelo, columna a columna
+        if not isinstance(escenarios, pd.DataFrame):
+            escenarios = pd.DataFrame.from_records(escenarios)
+        faltantes = [c for c in self.numericos if c not in escenarios]
+        if faltantes:
+            raise ValueError(f'Faltan los campos: {faltantes}')
+
+        forma = (len(escenarios), len(self.columnas))
+        X = out if out is not None and out.shape == forma else np.empty(forma, dtype=np.float64)
+        X[:] = 0
+        X[:, self.indices_numericos] = escenarios[self.numericos].to_numpy(dtype=np.float64)
+        for campo in self.banderas:
+            if campo in escenarios:
+                X[:, self.indices[campo]] = si_no(escenarios[campo])
+            else:
+                X[:, self.indices[campo]] = POR_DEFECTO[campo]
+        if 'season' in escenarios and len(self.estaciones):
+            season = escenarios['season'].astype(str).to_numpy(dtype=object)
+            X[:, self.indices_estacion] = season[:, None] == self.estaciones_array[None, :]
+        return X
+
+_esquema = None
+_candado = threading.Lock()
+
+def obtener_esquema(artefacto=None):
+    # Se reconstruye (y valida) solo cuando cambia el orden de columnas del artefacto servido
+    global _esquema
+    columnas = tuple(str(c) for c in (artefacto or Modelo.obtener_modelo())['columnas'])
+    esquema = _esquema
+    if esquema is None or esquema.columnas != columnas:
+        with _candado:
+            if _esquema is None or _esquema.columnas != columnas:
+                _esquema = EsquemaVariables(columnas)
+            esquema = _esquema
+    return esquema
@@ -0,0 +1,89 @@
+// Predicción en el navegador: el modelo es lineal, así que con los coeficientes, el esquema de variables y
+// (X'X)^-1, s² y t (publicados por el servidor en el store modelParameters) se calculan aquí la demanda,
+// su intervalo, el precio y la gráfica de costos sin ir al servidor.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    prediccion: {
+        fila: function (modelo, campos, checkBoxDummies, season) {
+            var x = new Array(modelo.coef.length).fill(0);
+            Object.keys(campos).forEach(function (campo) {
+                if (campo in modelo.indices) {
+                    x[modelo.indices[campo]] = Number(campos[campo]) || 0;
+                }
+            });
+            if ('holiday' in modelo.indices) {
+                x[modelo.indices.holiday] = (checkBoxDummies || []).indexOf('Holiday') >= 0 ? 1 : 0;
+            }
+            if ('functioningDay' in modelo.indices) {
+                x[modelo.indices.functioningDay] = 1;
+            }
+            if (season in modelo.seasons) {
+                x[modelo.seasons[season]] = 1;
+            }
+            return x;
+        },
+
+        estimar: function (modelo, x) {
+            // Igual que Modelo.predict_one: h = x0'(X'X)^-1 x0 con x0 = [1, x]
+            var V = modelo.xtxInv;
+            var media = modelo.intercept;
+            var h = V[0][0];
+            for (var i = 0; i < x.length; i++) {
+                if (x[i] === 0) {
+                    continue;
+                }
+                media += modelo.coef[i] * x[i];
+                h += 2 * x[i] * V[i + 1][0];
+                for (var j = 0; j < x.length; j++) {
+                    h += x[i] * V[i + 1][j + 1] * x[j];
+                }
+            }
+            var margen = modelo.t * Math.sqrt(modelo.s2 * (1 + h));
+            return {demand: media, inf: media - margen, sup: media + margen};
+        },
+
+        actualizar: function (modelo, mode, hour, temperature, humidity, windSpeed, dewPointTemperature,
+                              solarRadiation, rainfall, snowfall, checkBoxDummies, season,
+                              fixedCost, variableCost, profitability) {
+            var vacio = {data: [], layout: {}};
+            if (!modelo || mode !== 'live') {
+                return ['', '', vacio];
+            }
+            var functioning = (checkBoxDummies || []).indexOf('Functioning Day') >= 0;
+            if (!functioning) {
+                return ['', 'The sistem is on mantainance', vacio];
+            }
+            var ns = window.dash_clientside.prediccion;
+            var x = ns.fila(modelo, {hour: hour, temperature: temperature, humidity: humidity, windSpeed: windSpeed,
+                                     dewPointTemperature: dewPointTemperature, solarRadiation: solarRadiation,
+                                     rainfall: rainfall, snowfall: snowfall}, checkBoxDummies, season);
+            var p = ns.estimar(modelo, x);
+
+            var demand = p.demand < 0 ? '0'
+                : 'CI: (' + p.inf.toFixed(2) + ' , ' + p.sup.toFixed(2) + ')\nMedia: ' + p.demand.toFixed(2);
+
+            var costos = [fixedCost, variableCost, profitability].every(function (v) {
+                return v !== null && v !== undefined && v !== '';
+            });
+            var price = 'Enter the costs to get the suggested price';
+            if (costos) {
+                price = p.demand > 0
+                    ? ((fixedCost + variableCost * p.demand) / p.demand + profitability).toFixed(2)
+                    : 'The predicted demand is 0, the price can not be calculated';
+            }
+            var figura = vacio;
+            if (fixedCost !== null && fixedCost !== undefined && variableCost !== null && variableCost !== undefined) {
+                figura = {
+                    data: [{type: 'pie', labels: ['Fixed Cost', 'Variable Cost'],
+                            values: [fixedCost, variableCost * p.demand]}],
+                    layout: {title: {text: 'Hour Expenses', x: 0.5}}
+                };
+            }
+            return [demand, price, figura];
+        },
+
+        modo: function (mode) {
+            // El panel en vivo solo se muestra en ese modo
+            return mode === 'live' ? {'text-align': 'center'} : {display: 'none'};
+        }
+    }
+});
@@ -0,0 +1,16 @@
+# Configuración de gunicorn para Servidor:server (ver Servidor.py).
+# Variables de entorno: PUERTO (8050), WORKERS (núcleos disponibles), HILOS (4) y PRECARGA (1).
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PUERTO', '8050')}"
+workers = int(os.environ.get('WORKERS', len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()))
+threads = int(os.environ.get('HILOS', '4'))
+worker_class = 'gthread'
+
+# El maestro importa la aplicación (datos, cubo y modelo) una vez antes de crear los workers
+preload_app = os.environ.get('PRECARGA', '1') != '0'
+
+def post_fork(server, worker):
+    # Los hilos no sobreviven al fork: el reentrenamiento en segundo plano se arranca en cada worker
+    import Reentrenamiento
+    Reentrenamiento.obtener_servicio().iniciar()
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# Los módulos viven en la raíz del repositorio; la caché de las pruebas va a un directorio temporal
+# para no tocar los artefactos de cache/
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+os.environ.setdefault('MODELO_CACHE', tempfile.mkdtemp(prefix='cache_pruebas_'))
@@ -0,0 +1,63 @@
+import shutil
+import threading
+import pandas as pd
+import pytest
+import Almacen
+import Datos
+
+@pytest.fixture
+def almacen(tmp_path):
+    originales, limpios = tmp_path / 'originales.csv', tmp_path / 'limpios.csv'
+    shutil.copy(Datos.RUTA_ORIGINALES, originales)
+    shutil.copy(Datos.RUTA_LIMPIOS, limpios)
+    return Almacen.AlmacenHistorico(str(tmp_path / 'historico.sqlite'), str(originales), str(limpios))
+
+def test_reimportacion_fuera_de_la_peticion(almacen, monkeypatch):
+    version = almacen.version
+    antes = almacen.filas('Winter')
+    originales = pd.read_csv(almacen.ruta_originales)
+    originales[originales['Seasons'] == 'Winter'].tail(24).to_csv(almacen.ruta_originales, mode='a', header=False,
+                                                                 index=False)
+
+    # La consulta no espera la importación: responde con la base anterior mientras el hilo importa
+    continuar = threading.Event()
+    importar = Almacen.importar
+    monkeypatch.setattr(Almacen, 'importar', lambda *args: continuar.wait(60) and importar(*args))
+    assert almacen.filas('Winter') == antes
+    assert almacen.version == version
+
+    contenido = almacen.contenido
+    continuar.set()
+    almacen._hilo.join(60)
+    assert almacen.version == version + 1
+    assert almacen.contenido != contenido
+    assert almacen.filas('Winter') == antes + 24
+
+def test_otro_proceso_ya_importo(almacen, monkeypatch):
+    # Una segunda instancia sobre la misma base (otro worker) no vuelve a importar fuentes que no cambiaron
+    importaciones = []
+    monkeypatch.setattr(Almacen, 'importar', lambda *args: importaciones.append(args))
+    otro = Almacen.AlmacenHistorico(almacen.ruta_base, almacen.ruta_originales, almacen.ruta_limpios)
+    assert importaciones == []
+    assert otro.contenido == almacen.contenido
+    pd.testing.assert_frame_equal(otro.consultar('Summer'), almacen.consultar('Summer'))
+
+def test_desalojo_concurrente(almacen, monkeypatch):
+    monkeypatch.setattr(Almacen, 'CONSULTAS_EN_MEMORIA', 2)
+    errores = []
+
+    def consultar(feriado):
+        try:
+            for _ in range(20):
+                for season in almacen.estaciones():
+                    almacen.consultar(season, feriado=feriado)
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=consultar, args=(i % 2 == 0,)) for i in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert errores == []
+    assert len(almacen._distribuciones) <= 2
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+import pytest
+import Api
+import Modelo
+import Variables
+
+ESCENARIOS = pd.DataFrame([dict(hour=h, temperature=20, humidity=50, windSpeed=1, dewPointTemperature=5,
+                                solarRadiation=1, rainfall=0, snowfall=0, season='Summer') for h in range(24)])
+
+def test_puntuar_usa_un_solo_artefacto(monkeypatch):
+    # El modelo se intercambia (con otro orden de columnas) justo después de la primera consulta
+    servido = Modelo.obtener_modelo()
+    orden = np.arange(len(servido['columnas']))[::-1]
+    intercambiado = dict(servido, columnas=servido['columnas'][orden], coef=servido['coef'][orden],
+                         xtx_inv=servido['xtx_inv'][np.r_[0, orden + 1]][:, np.r_[0, orden + 1]])
+    artefactos = iter([servido] + [intercambiado] * 10)
+    monkeypatch.setattr(Modelo, 'obtener_modelo', lambda *args, **kwargs: next(artefactos))
+
+    resultado = Api.puntuar(ESCENARIOS)
+    esperado = Modelo.predict_batch(Variables.EsquemaVariables(servido['columnas']).matriz(ESCENARIOS),
+                                    artefacto=servido)
+    np.testing.assert_allclose(resultado['mean'], np.maximum(esperado[0], 0))
+
+def test_codificar_valida_el_esquema_contra_el_artefacto():
+    artefacto = Modelo.obtener_modelo()
+    esquema = Variables.obtener_esquema(artefacto)
+    assert esquema.validar(artefacto) is esquema
+    with pytest.raises(ValueError):
+        esquema.validar(dict(artefacto, columnas=artefacto['columnas'][::-1]))
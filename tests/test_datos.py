@@ -0,0 +1,73 @@
+import os
+import shutil
+import multiprocessing
+import pandas as pd
+import Datos
+
+def test_archivos_con_el_mismo_nombre_no_comparten_cache(tmp_path, monkeypatch):
+    # Dos ciudades con un archivo del mismo nombre en directorios distintos
+    rutas = []
+    for ciudad, filas in [('a', 100), ('b', 200)]:
+        (tmp_path / ciudad).mkdir()
+        ruta = tmp_path / ciudad / 'datos.csv'
+        pd.read_csv(Datos.RUTA_LIMPIOS).head(filas).to_csv(ruta, index=False)
+        rutas.append(str(ruta))
+
+    conversiones = []
+    convertir = Datos.convertir
+    monkeypatch.setattr(Datos, 'convertir', lambda ruta: conversiones.append(ruta) or convertir(ruta))
+    for _ in range(3):
+        assert [len(Datos.cargar(ruta)) for ruta in rutas] == [100, 200]
+    # Un CSV leído por archivo, no uno por carga
+    assert sorted(conversiones) == sorted(rutas)
+
+def test_nombre_cache_depende_de_la_ruta_absoluta(tmp_path, monkeypatch):
+    ruta = tmp_path / 'datos.csv'
+    shutil.copy(Datos.RUTA_LIMPIOS, ruta)
+    monkeypatch.chdir(tmp_path)
+    assert Datos.nombre_cache('datos.csv') == Datos.nombre_cache(str(ruta))
+    assert Datos.nombre_cache(str(ruta)) != Datos.nombre_cache(Datos.RUTA_LIMPIOS)
+
+def test_escritura_atomica_conserva_el_archivo_si_falla(tmp_path):
+    ruta = tmp_path / 'estado.json'
+    with Datos.escritura_atomica(str(ruta)) as f:
+        f.write('anterior')
+    try:
+        with Datos.escritura_atomica(str(ruta)) as f:
+            f.write('a medias')
+            raise RuntimeError('falla')
+    except RuntimeError:
+        pass
+    assert ruta.read_text(encoding='utf-8') == 'anterior'
+    assert [p.name for p in tmp_path.iterdir()] == ['estado.json']
+
+def _reescribir(ruta, veces):
+    data = pd.read_csv(Datos.RUTA_LIMPIOS)
+    for i in range(veces):
+        with Datos.escritura_atomica(ruta) as f:
+            data.head(100 if i % 2 else 200).to_csv(f, index=False)
+
+def _leer(ruta, veces, errores):
+    try:
+        for _ in range(veces):
+            # Todas las columnas de una misma versión: DataFrame falla si los largos no coinciden
+            assert len(Datos.cargar(ruta, mmap=False)) in (100, 200)
+    except Exception as e:
+        errores.put(repr(e))
+
+def test_conversiones_concurrentes_publican_versiones_completas(tmp_path):
+    ruta = str(tmp_path / 'datos.csv')
+    pd.read_csv(Datos.RUTA_LIMPIOS).head(200).to_csv(ruta, index=False)
+    contexto = multiprocessing.get_context('fork')
+    errores = contexto.Queue()
+    procesos = [contexto.Process(target=_reescribir, args=(ruta, 20))]
+    procesos += [contexto.Process(target=_leer, args=(ruta, 30, errores)) for _ in range(6)]
+    for proceso in procesos:
+        proceso.start()
+    for proceso in procesos:
+        proceso.join(120)
+    assert all(proceso.exitcode == 0 for proceso in procesos)
+    assert errores.empty(), errores.get()
+    # Quedan a lo sumo la versión vigente y la anterior
+    base = Datos._directorio_columnas(ruta)
+    assert len([d for d in os.listdir(base) if os.path.isdir(os.path.join(base, d))]) <= 2
@@ -0,0 +1,66 @@
+import shutil
+import pandas as pd
+import pytest
+import Estimadores
+import Modelo
+
+@pytest.fixture
+def ruta_datos(tmp_path):
+    ruta = str(tmp_path / 'limpios.csv')
+    shutil.copy(Modelo.RUTA_DATOS, ruta)
+    yield ruta
+    for clave in [c for c in Estimadores._ajustados if c[1] == ruta]:
+        del Estimadores._ajustados[clave]
+
+def sin_ajustes(monkeypatch):
+    def ajuste(*args, **kwargs):
+        raise AssertionError('Se ajustó un estimador')
+    monkeypatch.setattr(Modelo, 'particion', ajuste)
+
+def test_obtener_no_ajusta(ruta_datos, monkeypatch):
+    Estimadores.preparar(['ridge'], ruta_datos)
+    sin_ajustes(monkeypatch)
+    assert Estimadores.obtener('ridge', ruta_datos) is Estimadores.obtener('ridge', ruta_datos)
+    # Un backend que no se preparó es un error de la petición, no un ajuste dentro de ella
+    with pytest.raises(ValueError):
+        Estimadores.obtener('hgb', ruta_datos)
+    with pytest.raises(ValueError):
+        Estimadores.obtener('inexistente', ruta_datos)
+
+def test_preparar_carga_del_disco(ruta_datos, monkeypatch):
+    Estimadores.preparar(['ridge'], ruta_datos)
+    coef = Estimadores.obtener('ridge', ruta_datos).modelo[-1].coef_
+    Estimadores._ajustados.clear()
+    # Otro worker (o un reinicio) carga el estimador que quedó en disco sin volver a ajustar
+    sin_ajustes(monkeypatch)
+    Estimadores.preparar(['ridge'], ruta_datos)
+    assert (Estimadores.obtener('ridge', ruta_datos).modelo[-1].coef_ == coef).all()
+
+def test_reentrenar_intercambia_al_cambiar_los_datos(ruta_datos):
+    Estimadores.preparar(['ridge'], ruta_datos)
+    anterior = Estimadores.obtener('ridge', ruta_datos)
+    assert Estimadores.reentrenar() == []
+
+    datos = pd.read_csv(ruta_datos)
+    datos.head(500).to_csv(ruta_datos, mode='a', header=False, index=False)
+    # Hasta el reentrenamiento se sigue sirviendo el estimador anterior
+    assert Estimadores.obtener('ridge', ruta_datos) is anterior
+    assert 'ridge' in Estimadores.reentrenar()
+    assert Estimadores.obtener('ridge', ruta_datos) is not anterior
+
+def test_pickle_ilegible_o_de_otra_version_se_reajusta(ruta_datos):
+    Estimadores.preparar(['ridge'], ruta_datos)
+    ruta = Estimadores._ruta('ridge', ruta_datos)
+    ajustado = Estimadores._cargar(ruta)
+    Estimadores._guardar(dict(ajustado, version=(Estimadores.VERSION, '0.0')), ruta)
+    assert Estimadores._cargar(ruta) is None
+    Estimadores._ajustados.clear()
+    Estimadores.preparar(['ridge'], ruta_datos)
+    assert Estimadores._cargar(ruta) is not None
+
+    with open(ruta, 'wb') as f:
+        f.write(b'no es un pickle')
+    Estimadores._ajustados.clear()
+    Estimadores.preparar(['ridge'], ruta_datos)
+    assert Estimadores.obtener('ridge', ruta_datos).columnas is not None
+    assert Estimadores._cargar(ruta) is not None
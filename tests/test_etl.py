@@ -0,0 +1,40 @@
+import pandas as pd
+import Datos
+import ETL
+
+def _fuente(ruta, filas):
+    with open(Datos.RUTA_ORIGINALES, 'r', encoding='utf-8') as f:
+        lineas = f.readlines()[:filas + 1]
+    ruta.write_text(''.join(lineas), encoding='utf-8')
+
+def test_pasada_incremental_extiende_la_cache_sin_convertir(tmp_path, monkeypatch):
+    fuente, salida = tmp_path / 'fuente.csv', str(tmp_path / 'salida.csv')
+    _fuente(fuente, 300)
+    ETL.ejecutar(str(fuente), salida)
+    assert len(Datos.cargar(salida)) == 300
+
+    _fuente(fuente, 500)
+    conversiones = []
+    convertir = Datos.convertir
+    monkeypatch.setattr(Datos, 'convertir', lambda ruta: conversiones.append(ruta) or convertir(ruta))
+    assert ETL.ejecutar(str(fuente), salida)['filas_nuevas'] == 200
+    cache = Datos.cargar(salida, mmap=False)
+    assert conversiones == []
+    assert Datos.cache_vigente(salida)['filas'] == Datos.filas_csv(salida) == 500
+    pd.testing.assert_frame_equal(cache, pd.read_csv(salida), check_dtype=False)
+
+def test_sellar_descarta_filas_que_no_estan_en_el_csv(tmp_path):
+    salida = str(tmp_path / 'salida.csv')
+    data = pd.read_csv(Datos.RUTA_LIMPIOS).head(300)
+    data.head(200).to_csv(salida, index=False)
+    assert len(Datos.cargar(salida)) == 200
+
+    # Filas anexadas a la caché que nunca llegaron al CSV (p. ej. otro proceso reemplazó el CSV entre medio)
+    assert Datos.anexar(salida, data.tail(100), sellar=False)
+    assert len(Datos.cargar(salida)) == 200
+    assert not Datos.sellar_cache(salida)
+    assert len(Datos.cargar(salida)) == 200
+
+    data.to_csv(salida, index=False)
+    assert Datos.anexar(salida, data.tail(100))
+    pd.testing.assert_frame_equal(Datos.cargar(salida, mmap=False), data.reset_index(drop=True), check_dtype=False)
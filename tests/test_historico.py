@@ -0,0 +1,78 @@
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+import Datos
+import Cache
+import Historico
+import Registro
+
+@pytest.fixture
+def registro(tmp_path):
+    ruta = tmp_path / 'originales.csv'
+    shutil.copy(Datos.RUTA_ORIGINALES, ruta)
+    ciudades = {'Prueba': {'limpios': Datos.RUTA_LIMPIOS, 'originales': str(ruta)}}
+    return Registro.RegistroModelos(ciudades), ruta
+
+def cubo_completo(ruta):
+    return Historico.CuboDemanda(Datos.cargar(str(ruta), columnas=Datos.COLUMNAS_HISTORICO,
+                                              esquema=Datos.ESQUEMA_ORIGINALES))
+
+def test_cubo_recibe_filas_anexadas(registro):
+    registro, ruta = registro
+    cubo = registro.cubo('Prueba')
+    contenido = registro.contenido_cubo('Prueba')
+
+    # Se anexa una copia de las últimas filas, como haría una carga del ETL
+    originales = pd.read_csv(ruta)
+    originales.tail(48).to_csv(ruta, mode='a', header=False, index=False)
+
+    assert registro.contenido_cubo('Prueba') != contenido
+    assert registro.cubo('Prueba') is cubo
+    pd.testing.assert_frame_equal(cubo.tabla, cubo_completo(ruta).tabla)
+    assert cubo.filas('Winter') == cubo_completo(ruta).filas('Winter')
+
+def test_cubo_se_recalcula_si_el_archivo_se_reescribe(registro):
+    registro, ruta = registro
+    cubo = registro.cubo('Prueba')
+    originales = pd.read_csv(ruta)
+    originales[originales['Seasons'] != 'Winter'].to_csv(ruta, index=False)
+
+    registro.contenido_cubo('Prueba')
+    assert 'Winter' not in cubo.estaciones()
+    pd.testing.assert_frame_equal(cubo.tabla, cubo_completo(ruta).tabla)
+
+def test_clave_de_figura_depende_del_contenido(tmp_path):
+    # Dos workers con cubos en la misma versión local pero datos distintos no comparten figuras
+    originales = pd.read_csv(Datos.RUTA_ORIGINALES)
+    rutas = [tmp_path / 'a.csv', tmp_path / 'b.csv', tmp_path / 'c.csv']
+    originales.to_csv(rutas[0], index=False)
+    originales.head(-24).to_csv(rutas[1], index=False)
+    originales.to_csv(rutas[2], index=False)
+    claves = []
+    for ruta in rutas:
+        registro = Registro.RegistroModelos({'Prueba': {'limpios': Datos.RUTA_LIMPIOS, 'originales': str(ruta)}})
+        assert registro.cubo('Prueba').version == 1
+        claves.append(Cache.clave('updateHistoricDemand', registro.contenido_cubo('Prueba'), 'Winter', 'Prueba'))
+    assert claves[0] != claves[1]
+    # Y con los mismos datos sí la comparten
+    assert claves[0] == claves[2]
+
+def test_cubo_guarda_distribuciones_y_no_filas():
+    data = Datos.cargar(Datos.RUTA_ORIGINALES, columnas=Datos.COLUMNAS_HISTORICO, esquema=Datos.ESQUEMA_ORIGINALES)
+    cubo = Historico.CuboDemanda(data.head(4000)).actualizar(data.iloc[4000:])
+    grupos = data.groupby(Historico.CLAVES, observed=True)[Historico.VARIABLE_DEMANDA]
+    for (season, hora), grupo in grupos:
+        valores = grupo.to_numpy(dtype=np.float64)
+        esperado = [len(valores), valores.mean(), *np.percentile(valores, [50, 10, 25, 75, 90]), valores.min(),
+                    valores.max()]
+        np.testing.assert_allclose(cubo.tabla.loc[(season, hora)].to_numpy(dtype=np.float64), esperado)
+    horas, demandas = cubo.puntos('Winter')
+    np.testing.assert_array_equal(np.sort(demandas), np.sort(data.loc[data['Seasons'] == 'Winter',
+                                                                      Historico.VARIABLE_DEMANDA].to_numpy()))
+    # Con el doble de historia repetida las celdas no crecen: su tamaño depende de los valores distintos
+    doble = Historico.CuboDemanda(data).actualizar(data)
+    for clave, (valores, acumulado) in cubo._grupos.items():
+        assert valores.dtype == data[Historico.VARIABLE_DEMANDA].dtype
+        np.testing.assert_array_equal(doble._grupos[clave][0], valores)
+        np.testing.assert_array_equal(doble._grupos[clave][1], 2 * acumulado)
@@ -0,0 +1,90 @@
+import os
+import time
+import flask
+import pytest
+import Metricas
+
+@pytest.fixture
+def cliente(tmp_path):
+    server = flask.Flask(__name__)
+    Metricas.instalar(server, str(tmp_path))
+
+    @server.route('/hola')
+    def hola():
+        return 'hola'
+
+    @server.route('/falla')
+    def falla():
+        raise RuntimeError('falla')
+
+    return server.test_client(), tmp_path
+
+def perfiles(directorio):
+    return [f for f in os.listdir(directorio) if f.endswith('.prof')]
+
+def test_cabecera_ignorada_sin_token(cliente, monkeypatch):
+    cliente, directorio = cliente
+    monkeypatch.setattr(Metricas, 'TOKEN_PERFIL', None)
+    respuesta = cliente.get('/hola', headers={'X-Perfil': '1'})
+    assert respuesta.status_code == 200
+    assert 'X-Perfil-Archivo' not in respuesta.headers
+    assert perfiles(directorio) == []
+
+def test_cabecera_con_token_incorrecto(cliente, monkeypatch):
+    cliente, directorio = cliente
+    monkeypatch.setattr(Metricas, 'TOKEN_PERFIL', 'secreto')
+    assert 'X-Perfil-Archivo' not in cliente.get('/hola', headers={'X-Perfil': 'otro'}).headers
+    assert 'X-Perfil-Archivo' in cliente.get('/hola', headers={'X-Perfil': 'secreto'}).headers
+
+def test_rotacion_de_volcados(tmp_path):
+    for i in range(5):
+        ruta = tmp_path / f'{i}.prof'
+        ruta.write_bytes(b'')
+        os.utime(ruta, (time.time() + i, time.time() + i))
+    Metricas.rotar_perfiles(str(tmp_path), maximo=2)
+    assert sorted(perfiles(tmp_path)) == ['3.prof', '4.prof']
+
+def test_una_peticion_perfilada_a_la_vez(cliente, monkeypatch):
+    # Con otra petición perfilándose, esta se atiende sin perfil en lugar de fallar
+    cliente, directorio = cliente
+    monkeypatch.setattr(Metricas, 'UMBRAL_PERFIL_MS', '0')
+    with Metricas._perfilando:
+        respuesta = cliente.get('/hola')
+    assert respuesta.status_code == 200
+    assert 'X-Perfil-Archivo' not in respuesta.headers
+    assert 'X-Perfil-Archivo' in cliente.get('/hola').headers
+
+def test_perfilador_liberado_si_la_peticion_falla(cliente, monkeypatch):
+    cliente, directorio = cliente
+    monkeypatch.setattr(Metricas, 'UMBRAL_PERFIL_MS', '0')
+    assert cliente.get('/falla').status_code == 500
+    assert not Metricas._perfilando.locked()
+
+def test_duracion_incluye_el_streaming(cliente):
+    cliente, directorio = cliente
+    server = cliente.application
+
+    @server.route('/lento')
+    def lento():
+        def generar():
+            yield 'a'
+            time.sleep(0.3)
+            yield 'b'
+        return flask.Response(generar())
+
+    respuesta = cliente.get('/lento')
+    assert respuesta.data == b'ab'
+    # El servidor WSGI cierra la respuesta después de enviar el último fragmento
+    respuesta.close()
+    histograma = Metricas._histogramas[Metricas._clave('http_peticion_segundos', {'ruta': '/lento'})]
+    assert histograma.cuenta == 1 and histograma.suma >= 0.3
+
+def test_lecturas_csv_contadas(tmp_path):
+    import Datos
+    import Pronostico
+    ruta = tmp_path / 'originales.csv'
+    ruta.write_text(open(Datos.RUTA_ORIGINALES, encoding='utf-8').read(), encoding='utf-8')
+    clave = Metricas._clave('datos_lecturas_csv_total', {'archivo': 'originales.csv'})
+    antes = Metricas._contadores.get(clave, 0)
+    Pronostico.ejemplo(ruta=str(ruta))
+    assert Metricas._contadores[clave] == antes + 1
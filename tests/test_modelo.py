@@ -0,0 +1,84 @@
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+import sklearn.linear_model as lm
+import statsmodels.api as sm
+import Modelo
+
+INVIERNO = {'Seasons_Winter': 1}
+
+@pytest.fixture
+def ruta_artefacto(tmp_path):
+    ruta = str(tmp_path / 'modelo.npz')
+    yield ruta
+    # Sin el candado de Modelo: si una prueba lo deja tomado, la limpieza no debe colgarse
+    for cache in (Modelo._artefactos, Modelo._motores, Modelo._origenes, Modelo._publicaciones):
+        cache.pop(ruta, None)
+
+def nuevas_filas(filtro=None, n=5):
+    X_new, Y_new, _ = Modelo.particion(Modelo.RUTA_DATOS, filtro)
+    return pd.concat([X_new, Y_new], axis=1).tail(n)
+
+def reajuste(nuevos, filtro=None):
+    # Ajuste completo sobre la partición de entrenamiento más las filas nuevas
+    X_new, Y_new, (X_train, X_test, Y_train, Y_test) = Modelo.particion(Modelo.RUTA_DATOS, filtro)
+    X = pd.concat([X_train, nuevos[X_new.columns]])
+    y = pd.concat([Y_train, nuevos[Modelo.VARIABLE_OBJETIVO]])
+    return lm.LinearRegression().fit(X, y)
+
+def actualizar_con_limite(*args, limite=120, **kwargs):
+    # Un bloqueo mutuo dejaría el hilo vivo después del límite en lugar de colgar toda la suite
+    resultado = {}
+    hilo = threading.Thread(target=lambda: resultado.update(artefacto=Modelo.actualizar_modelo(*args, **kwargs)),
+                            daemon=True)
+    hilo.start()
+    hilo.join(limite)
+    assert not hilo.is_alive(), 'actualizar_modelo no terminó (¿bloqueo mutuo?)'
+    return resultado['artefacto']
+
+def test_actualizar_modelo_en_frio_igual_a_reajuste(ruta_artefacto):
+    # Proceso sin el artefacto en memoria: obtener_modelo lo entrena dentro de actualizar_modelo
+    assert ruta_artefacto not in Modelo._artefactos
+    nuevos = nuevas_filas()
+    artefacto = actualizar_con_limite(nuevos, ruta_artefacto=ruta_artefacto)
+
+    esperado = reajuste(nuevos)
+    np.testing.assert_allclose(artefacto['coef'], esperado.coef_, rtol=1e-6, atol=1e-6)
+    assert artefacto['intercept'] == pytest.approx(esperado.intercept_, rel=1e-6)
+    assert Modelo._artefactos[ruta_artefacto] is artefacto
+
+def test_actualizar_modelo_despues_de_descartar(ruta_artefacto):
+    Modelo.obtener_modelo(ruta_artefacto=ruta_artefacto)
+    Modelo.descartar(ruta_artefacto)
+    nuevos = nuevas_filas()
+    artefacto = actualizar_con_limite(nuevos, ruta_artefacto=ruta_artefacto)
+    np.testing.assert_allclose(artefacto['coef'], reajuste(nuevos).coef_, rtol=1e-6, atol=1e-6)
+
+def test_actualizar_modelo_de_segmento(ruta_artefacto):
+    # El motor de un segmento arranca con las filas y columnas del segmento, no con las de toda la ciudad
+    servido = Modelo.obtener_modelo(ruta_artefacto=ruta_artefacto, filtro=INVIERNO)
+    nuevos = nuevas_filas(INVIERNO)
+    artefacto = actualizar_con_limite(nuevos, ruta_artefacto=ruta_artefacto)
+
+    assert list(artefacto['columnas']) == list(servido['columnas'])
+    esperado = reajuste(nuevos, INVIERNO)
+    np.testing.assert_allclose(artefacto['coef'], esperado.coef_, rtol=1e-6, atol=1e-6)
+    assert artefacto['intercept'] == pytest.approx(esperado.intercept_, rel=1e-6)
+
+def test_intervalo_exacto_igual_a_statsmodels(ruta_artefacto):
+    artefacto = Modelo.obtener_modelo(ruta_artefacto=ruta_artefacto)
+    X_new, Y_new, (X_train, X_test, Y_train, Y_test) = Modelo.particion(Modelo.RUTA_DATOS)
+    ajuste = sm.OLS(Y_train.to_numpy(dtype=np.float64), sm.add_constant(X_train.to_numpy(dtype=np.float64))).fit()
+    X = X_test.head(200)
+    esperado = ajuste.get_prediction(sm.add_constant(X.to_numpy(dtype=np.float64), has_constant='add'))
+    esperado = esperado.summary_frame(alpha=1 - Modelo.NIVEL_CONFIANZA)
+
+    media, inf, sup = Modelo.predict_batch(X, artefacto=artefacto)
+    np.testing.assert_allclose(media, esperado['mean'], rtol=1e-7, atol=1e-6)
+    np.testing.assert_allclose(inf, esperado['obs_ci_lower'], rtol=1e-7, atol=1e-6)
+    np.testing.assert_allclose(sup, esperado['obs_ci_upper'], rtol=1e-7, atol=1e-6)
+
+    # Uno a uno da lo mismo que el lote
+    uno = np.array([Modelo.predict_one(fila, artefacto=artefacto) for fila in X.to_numpy(dtype=np.float64)])
+    np.testing.assert_allclose(uno, np.column_stack([media, inf, sup]), rtol=1e-10, atol=1e-8)
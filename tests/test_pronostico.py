@@ -0,0 +1,14 @@
+import pandas as pd
+import pytest
+import Pronostico
+
+def horizonte(fechas):
+    dias = pd.date_range('2018-12-07', periods=7)
+    return pd.DataFrame({'date': [d.strftime(fechas) for d in dias for _ in range(24)], 'hour': list(range(24)) * 7})
+
+@pytest.mark.parametrize('fechas', ['%Y-%m-%d', '%d/%m/%Y'])
+def test_momentos_con_fechas_iso_y_del_dataset(fechas):
+    momentos = Pronostico.momentos(horizonte(fechas))
+    # Con el día y el mes invertidos el primer día sería el 12 de julio y el último no sería una fecha válida
+    assert momentos.iloc[0] == pd.Timestamp('2018-12-07 00:00')
+    assert momentos.iloc[-1] == pd.Timestamp('2018-12-13 23:00')
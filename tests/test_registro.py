@@ -0,0 +1,72 @@
+import time
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+import Datos
+import Modelo
+import Reentrenamiento
+import Registro
+
+ESCENARIO = dict(hour=8, temperature=20, humidity=50, windSpeed=1, dewPointTemperature=5, solarRadiation=1,
+                 rainfall=0, snowfall=0, season='Summer')
+
+def test_lote_con_ciudad_solo_en_algunas_filas():
+    registro = Registro.RegistroModelos()
+    lote = [dict(ESCENARIO, city='Seoul'), dict(ESCENARIO), dict(ESCENARIO, city=None)]
+    media, inf, sup = registro.predecir(lote)
+    esperado = registro.predecir(pd.DataFrame([ESCENARIO] * 3))
+    np.testing.assert_allclose(media, esperado[0])
+
+def test_ajuste_en_frio_no_bloquea_el_registro(monkeypatch):
+    registro = Registro.RegistroModelos()
+    registro.entrada()
+    # El ajuste del segmento queda detenido hasta que la otra petición termine
+    continuar = threading.Event()
+    obtener_modelo = Modelo.obtener_modelo
+
+    def lento(ruta_datos=Datos.RUTA_LIMPIOS, ruta_artefacto=Modelo.RUTA_ARTEFACTO, filtro=None):
+        if filtro is not None:
+            continuar.wait(60)
+        return obtener_modelo(ruta_datos, ruta_artefacto, filtro)
+
+    monkeypatch.setattr(Modelo, 'obtener_modelo', lento)
+    frio = threading.Thread(target=registro.entrada, args=(Registro.CIUDAD_POR_DEFECTO, 'Winter'), daemon=True)
+    frio.start()
+    caliente = threading.Thread(target=registro.entrada, daemon=True)
+    caliente.start()
+    caliente.join(10)
+    bloqueado = caliente.is_alive()
+    continuar.set()
+    frio.join(60)
+    assert not bloqueado
+
+def test_reentrenamiento_sirve_el_anterior_y_calienta_el_nuevo(tmp_path, monkeypatch):
+    ruta = tmp_path / 'limpios.csv'
+    shutil.copy(Datos.RUTA_LIMPIOS, ruta)
+    registro = Registro.RegistroModelos({'Prueba': {'limpios': str(ruta), 'originales': Datos.RUTA_ORIGINALES}})
+    monkeypatch.setattr(Registro, '_registro', registro)
+    anterior = registro.entrada('Prueba')
+    registro.tabla('Prueba')
+    ruta_artefacto = registro.ruta_artefacto('Prueba')
+    version = Modelo.version_publicada(ruta_artefacto)[0]
+
+    servicio = Reentrenamiento.ServicioReentrenamiento(intervalo=0).iniciar()
+    try:
+        pd.read_csv(ruta).head(500).to_csv(ruta, mode='a', header=False, index=False)
+        # La petición no espera el ajuste: responde con el artefacto anterior y avisa al servicio
+        assert registro.entrada('Prueba')['artefacto'] is anterior['artefacto']
+        limite = time.monotonic() + 60
+        while (registro._entradas[('Prueba', None)]['tabla'] is None
+               or registro._entradas[('Prueba', None)]['artefacto'] is anterior['artefacto']):
+            assert time.monotonic() < limite
+            time.sleep(0.05)
+    finally:
+        servicio.detener()
+        Modelo.descartar(ruta_artefacto)
+
+    # El hilo de reentrenamiento dejó lista la entrada y la tabla del artefacto nuevo, sin ninguna petición
+    entrada = registro._entradas[('Prueba', None)]
+    assert Modelo.version_publicada(ruta_artefacto)[0] == version + 1
+    assert entrada['artefacto']['hash'] == Datos.hash_archivo(str(ruta))
+    assert entrada['tabla'] is not None
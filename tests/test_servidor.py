@@ -0,0 +1,23 @@
+import os
+import socket
+import importlib.util
+import pytest
+import Benchmark
+
+pytestmark = pytest.mark.skipif(
+    importlib.util.find_spec('gunicorn') is None or not os.path.exists('/proc/self/smaps_rollup'),
+    reason='Requiere gunicorn y /proc (Linux)')
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def test_workers_comparten_la_aplicacion_precargada():
+    resultados = Benchmark.medir_memoria_workers([1, 2], puerto=puerto_libre(), peticiones=5)
+    assert Benchmark.verificar_memoria_workers(resultados) == []
+
+def test_verificacion_detecta_workers_sin_precarga():
+    # Sin preload_app cada worker carga su propia copia: la verificación tiene que fallar
+    resultados = Benchmark.medir_memoria_workers([2], puerto=puerto_libre(), peticiones=5, precarga=False)
+    assert Benchmark.verificar_memoria_workers(resultados) != []
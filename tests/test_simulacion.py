@@ -0,0 +1,17 @@
+import warnings
+import numpy as np
+import Simulacion
+
+def test_costos_cero_sin_advertencias():
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        simulacion = Simulacion.simular(500.0, 100.0, 0.0, 0.0)
+    assert (simulacion['precios'] > 0).all()
+    # Sin costos cualquier precio positivo los cubre
+    np.testing.assert_array_equal(simulacion['probabilidad_cubrir'], 1.0)
+
+def test_margen_cero_con_costo_fijo():
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        probabilidad = Simulacion.probabilidad_cubrir(np.arange(10.0), [0.0, 5.0], 2.0, 2.0)
+    np.testing.assert_array_equal(probabilidad, [0.0, 0.0])